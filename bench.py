@@ -0,0 +1,318 @@
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+import numpy as np
+
+import index
+
+# =====================================================
+# FRAME LOOP BENCHMARK
+# =====================================================
+#
+# Times FrameWriter's packing loop on its own: frames go to a writer that
+# discards them and steganography embeds into a static in-memory cover, so
+# the numbers are not dominated by the FFV1 codec.
+#
+#   python bench.py frames [--frames N]
+#   python bench.py suite [--size MB] [-o results.json]
+#   python bench.py importtime
+
+RESOLUTIONS = ["256x256", "512x512", "1024x1024", "1920x1080"]
+MODES = [("normal", 8), ("steg 1-bit", 1), ("steg 2-bit", 2), ("steg 3-bit", 3), ("steg 4-bit", 4)]
+
+class NullWriter:
+    """VideoWriter stand-in that discards every frame."""
+
+    def write(self, frame):
+        pass
+
+    def release(self):
+        pass
+
+class StaticCover:
+    """VideoCapture stand-in that serves the same random frame forever.
+
+    Like cv2.VideoCapture.read, it fills `image` when one is passed and
+    returns a fresh array otherwise.
+    """
+
+    def __init__(self, width, height):
+        rng = np.random.default_rng(0)
+        self.frame = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+    def read(self, image=None):
+        if image is None:
+            return True, self.frame.copy()
+        np.copyto(image, self.frame)
+        return True, image
+
+def bench_frames(resolution, k=8, frames=200):
+    """Frames per second FrameWriter packs at a resolution and bits-per-channel setting."""
+    width, height = map(int, resolution.split("x"))
+    cover = None if k == 8 else StaticCover(width, height)
+    sink = index.FrameWriter(NullWriter(), width, height, k, cover=cover)
+    chunk = os.urandom(sink.capacity)
+
+    sink.write(chunk)   # warm-up frame
+    start = time.perf_counter()
+    for _ in range(frames):
+        sink.write(chunk)
+    elapsed = time.perf_counter() - start
+    return frames / elapsed
+
+# =====================================================
+# IMPORT TIME BUDGET
+# =====================================================
+#
+# CLI calls and spawned pool workers import the backend fresh, so its import
+# must stay cheap: heavy modules are loaded lazily, on first use.
+# tests/test_import_time.py enforces the budget.
+
+IMPORT_BUDGET_MS = 150
+HEAVY_MODULES = ("cv2", "numpy", "tkinter", "customtkinter", "multiprocessing")
+
+def import_time(module):
+    """(milliseconds, modules loaded) for a fresh `import module`, from python -X importtime."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=Path(__file__).parent, capture_output=True, text=True, check=True)
+    total, loaded = 0, set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # column header
+        loaded.add(name.strip().split(".")[0])
+        if name.strip() == module:
+            total = int(cumulative) / 1000
+    return total, loaded
+
+def check_import_time(modules=("index", "cli"), budget=IMPORT_BUDGET_MS):
+    """Print each module's import time; True if all are within budget and load nothing heavy."""
+    ok = True
+    for module in modules:
+        ms, loaded = import_time(module)
+        heavy = [m for m in HEAVY_MODULES if m in loaded]
+        within = ms <= budget and not heavy
+        ok &= within
+        print(f"import {module}: {ms:.0f} ms (budget {budget} ms)"
+              + (f", loads {', '.join(heavy)}" if heavy else "") + ("" if within else "  FAIL"))
+    return ok
+
+# =====================================================
+# END-TO-END SUITE
+# =====================================================
+#
+# Runs the real encode and extract paths (codec, zip, disk and all) on
+# synthetic payloads at each resolution and writes the numbers to JSON, so
+# two versions can be compared by diffing their result files. Every case
+# runs in a fresh interpreter: peak RSS is per case, and one case's caches
+# don't speed up the next.
+
+PAYLOADS = ("random", "compressible", "mixed")
+SUITE_MODES = {
+    "normal": {"steganography": False},
+    "steg": {"steganography": True, "steg_bits": 2, "steg_trim": True},
+}
+WORDS = ("frame", "video", "payload", "archive", "pixel", "header", "stream", "cover",
+         "shard", "codec", "the", "of", "and", "to", "in", "is", "bit", "byte")
+
+def write_random(path, size, rng):
+    with open(path, "wb") as f:
+        for start in range(0, size, 1 << 20):
+            f.write(rng.integers(0, 256, min(1 << 20, size - start), dtype=np.uint8).tobytes())
+
+def write_text(path, size, rng):
+    """Log-like text that deflates to roughly a quarter of its size."""
+    with open(path, "wb") as f:
+        written = 0
+        while written < size:
+            words = rng.choice(WORDS, 200_000)
+            block = (" ".join(words) + "\n").encode()[:size - written]
+            f.write(block)
+            written += len(block)
+
+def make_payload(folder, kind, size, seed=0):
+    """Create a `size`-byte synthetic payload folder of the given kind (see PAYLOADS)."""
+    rng = np.random.default_rng(seed)
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    if kind == "random":
+        write_random(folder / "random.bin", size, rng)
+    elif kind == "compressible":
+        write_text(folder / "log.txt", size, rng)
+    elif kind == "mixed":
+        # One large binary, one large text file and a tail of small files,
+        # which exercise the per-member zip overhead
+        small = min(200, size // (8 << 10))
+        write_random(folder / "blob.bin", size * 2 // 5, rng)
+        write_text(folder / "notes.txt", size * 2 // 5, rng)
+        rest = size - 2 * (size * 2 // 5)
+        (folder / "small").mkdir(exist_ok=True)
+        for i in range(small):
+            part = rest // small if i < small - 1 else rest - (small - 1) * (rest // small)
+            writer = write_random if i % 2 else write_text
+            writer(folder / "small" / f"{i:03d}.dat", part, rng)
+    else:
+        raise ValueError(f"Unknown payload {kind!r}; choose from {', '.join(PAYLOADS)}.")
+    return folder
+
+def make_cover(path, width, height, frames, fps=24, seed=0):
+    """Write a lossless cover video of drifting gradients with sensor-like noise."""
+    import cv2
+    rng = np.random.default_rng(seed)
+    out = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"FFV1"), fps, (width, height))
+    if not out.isOpened():
+        raise RuntimeError(f"Could not open a writer for {path}.")
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    for i in range(frames):
+        base = np.stack([(x + 4 * i) / width, y / height, (x + y + 2 * i) / (width + height)], axis=-1)
+        noise = rng.normal(0, 3, base.shape)
+        out.write(np.clip(base * 255 + noise, 0, 255).astype(np.uint8))
+    out.release()
+    return str(path)
+
+def peak_rss_mb():
+    """Peak resident memory of this process and its finished children, or None where unsupported."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Linux carries ru_maxrss across fork and exec, so a case process would
+    # report the suite's own peak; VmHWM belongs to this address space only
+    status = Path("/proc/self/status")
+    if status.exists():
+        own = next(int(line.split()[1]) for line in status.read_text().splitlines() if line.startswith("VmHWM:"))
+    else:
+        own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak = max(own, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1 << 20 if sys.platform == "darwin" else 1 << 10)
+
+def output_size(video_path):
+    """Bytes on disk of an encoded video, counting every video a manifest lists.
+
+    Covers shard sets ("shards"), append and checkpoint chains ("segments")
+    and multi-cover stego sets ("videos").
+    """
+    path = Path(video_path)
+    if path.suffix.lower() != ".json":
+        return path.stat().st_size
+    manifest = index.load_manifest(path)
+    entries = manifest.get("shards") or manifest.get("segments") or manifest.get("videos") or []
+    return path.stat().st_size + sum((path.parent / e["file"]).stat().st_size for e in entries)
+
+def run_case(case):
+    """Run one encode or extract case in this process and return its measurements."""
+    events = []
+    timings = {}
+    start = time.perf_counter()
+    if case["stage"] == "encode":
+        output = index.encode(case["settings"], events.append, inputs=[case["payload"]],
+                              out_path=case["video"], cover=case.get("cover"), timings=timings)
+    else:
+        index.extract(case["video"], case["settings"], events.append, dest=case["dest"], timings=timings)
+        output = case["video"]
+    elapsed = time.perf_counter() - start
+    frames = events[-1]["frames"] if events else 0
+    rss = peak_rss_mb()
+    return {
+        "seconds": round(elapsed, 3),
+        "mbps": round(case["payload_bytes"] / 1e6 / elapsed, 2),
+        "fps": round(frames / elapsed, 1),
+        "frames": frames,
+        "peak_rss_mb": None if rss is None else round(rss, 1),
+        "output_bytes": output_size(output) if case["stage"] == "encode" else None,
+        "stages": {name: round(entry["seconds"], 4) for name, entry in timings["stages"].items()},
+    }
+
+def spawn_case(case):
+    """run_case in a fresh interpreter."""
+    result = subprocess.run([sys.executable, __file__, "case", json.dumps(case)],
+                            cwd=Path(__file__).parent, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{case['stage']} case failed:\n{result.stderr.strip()}")
+    return json.loads(result.stdout)
+
+def folder_size(folder):
+    return sum(f.stat().st_size for f in Path(folder).rglob("*") if f.is_file())
+
+def run_suite(size_mb=16, resolutions=RESOLUTIONS, modes=tuple(SUITE_MODES), payloads=PAYLOADS, workdir=None):
+    """Benchmark encode and extract for every resolution, mode and payload; return the report."""
+    work = Path(tempfile.mkdtemp(prefix="bitstream-bench-", dir=workdir))
+    results = []
+    try:
+        for kind in payloads:
+            payload = make_payload(work / "payloads" / kind, kind, int(size_mb * 1e6))
+            payload_bytes = folder_size(payload)
+            for res in resolutions:
+                width, height = map(int, res.split("x"))
+                for mode in modes:
+                    settings = dict(index.DEFAULT_SETTINGS, resolution=res, **SUITE_MODES[mode])
+                    case = {"settings": settings, "payload": str(payload), "payload_bytes": payload_bytes,
+                            "video": str(work / f"{kind}-{res}-{mode}.avi"), "dest": str(work / "extracted")}
+                    if settings["steganography"]:
+                        # Enough cover for the archive's upper-bound size, which is what encode checks
+                        capacity = index.frame_capacity(width, height, settings["steg_bits"])
+                        bound = index.estimate_archive_size(index.input_entries([payload]))
+                        case["cover"] = make_cover(work / f"cover-{res}.avi", width, height,
+                                                   math.ceil(bound / capacity) + 1)
+                    for stage in ("encode", "extract"):
+                        row = {"payload": kind, "resolution": res, "mode": mode, "stage": stage,
+                               "payload_bytes": payload_bytes}
+                        row.update(spawn_case(dict(case, stage=stage)))
+                        results.append(row)
+                        print(f"{kind:<13}{res:<11}{mode:<8}{stage:<9}{row['mbps']:>8.1f} MB/s"
+                              f"{row['fps']:>9.1f} fps{row['peak_rss_mb'] or 0:>8.0f} MB RSS", flush=True)
+                    shutil.rmtree(case["dest"], ignore_errors=True)
+                    for f in work.glob(f"{kind}-{res}-{mode}*"):
+                        f.unlink()
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    return {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "numpy": np.__version__, "opencv": __import__("cv2").__version__,
+            "platform": platform.platform(), "cpus": os.cpu_count(), "size_mb": size_mb,
+            "results": results}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="bench.py", description="BitStream benchmarks.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("frames", help="FrameWriter packing loop, without the codec")
+    p.add_argument("--frames", type=int, default=200)
+    p = sub.add_parser("suite", help="end-to-end encode and extract throughput, written to JSON")
+    p.add_argument("--size", type=float, default=16, help="payload size in MB (default 16)")
+    p.add_argument("--resolutions", nargs="+", default=RESOLUTIONS)
+    p.add_argument("--modes", nargs="+", choices=list(SUITE_MODES), default=list(SUITE_MODES))
+    p.add_argument("--payloads", nargs="+", choices=PAYLOADS, default=list(PAYLOADS))
+    p.add_argument("--workdir", help="where payloads and videos are staged (default: system temp)")
+    p.add_argument("-o", "--output", default="bench-results.json")
+    sub.add_parser("importtime", help="check the backend's import time budget")
+    p = sub.add_parser("case")   # one suite case; used by spawn_case
+    p.add_argument("case")
+    args = parser.parse_args(argv)
+
+    if args.command == "importtime":
+        sys.exit(0 if check_import_time() else 1)
+    if args.command == "case":
+        print(json.dumps(run_case(json.loads(args.case))))
+    elif args.command == "suite":
+        report = run_suite(args.size, args.resolutions, args.modes, args.payloads, args.workdir)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+        print(f"Results written to {args.output}")
+    else:
+        print(f"{'resolution':<12}" + "".join(f"{name:>14}" for name, _ in MODES))
+        for res in RESOLUTIONS:
+            row = [bench_frames(res, k, args.frames) for _, k in MODES]
+            print(f"{res:<12}" + "".join(f"{fps:>10.0f} fps" for fps in row))
+
+if __name__ == "__main__":
+    main()
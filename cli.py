@@ -0,0 +1,228 @@
+import argparse
+import json
+import os
+import sys
+
+import index
+
+# =====================================================
+# HEADLESS COMMAND LINE
+# =====================================================
+#
+#   python cli.py encode FILE_OR_FOLDER... -o OUT.avi [--cover COVER...] [--set key=value]...
+#   python cli.py extract VIDEO -o DEST_FOLDER
+#   python cli.py inspect VIDEO
+#   python cli.py verify VIDEO
+#   python cli.py append VIDEO FILE_OR_FOLDER... [--set key=value]...
+#   python cli.py backup FILE_OR_FOLDER... -o BACKUP_FOLDER [--set key=value]...
+#   python cli.py batch JOBS.json [--workers N]
+#
+# encode with several covers spreads the payload over all of them and
+# prints the span manifest (OUT.json) that extract takes in their place.
+# append adds files to an encoded video as a new segment and prints the
+# chain manifest (VIDEO.json) that stands in for the video from then on.
+# backup encodes only the chunks no earlier run into BACKUP_FOLDER stored
+# and writes a backup-NNNN.json manifest; extract restores the full tree
+# from any manifest.
+#
+# encode and extract take --timings, which adds a per-stage time report to
+# the result, and --profile FILE, which runs them under cProfile and dumps
+# the stats to FILE (read them with python -m pstats FILE).
+#
+# Every path is explicit and nothing goes through the input, cover or
+# output folders, so any number of runs can share a machine. Settings start
+# from the defaults (not settings.json) and are changed with --settings
+# FILE and --set key=value.
+#
+# A batch file is a JSON list of jobs, each the keyword form of a command:
+#   {"command": "encode", "inputs": ["docs"], "output": "docs.avi",
+#    "cover": "cover.mp4", "settings": {"resolution": "512x512"}}
+#   {"command": "extract", "video": "docs.avi", "output": "restored/docs",
+#    "timings": true, "profile": "docs.prof", "depends_on": [0]}
+# Jobs run at the same time on a process pool, in no set order, except
+# that a job starts only after the jobs listed in its "depends_on" (their
+# positions in the list) have finished; if one of those failed, the job is
+# reported as failed without running. One JSON result line is printed per
+# job, as each finishes.
+
+COMMANDS = ("encode", "extract", "inspect", "verify", "append", "backup")
+
+def parse_value(text):
+    """Settings values are JSON when they parse as JSON (numbers, booleans), else strings."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return text
+
+def job_settings(base=None, settings_file=None, overrides=()):
+    settings = dict(index.DEFAULT_SETTINGS)
+    if settings_file:
+        with open(settings_file) as f:
+            settings.update(json.load(f))
+    settings.update(base or {})
+    for item in overrides:
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"--set expects key=value, got {item!r}.")
+        settings[key] = parse_value(value)
+    return settings
+
+def print_progress(event):
+    """Progress callback for interactive runs: one status line, rewritten in place."""
+    line = f"\r{event['stage']}: {event['frames']} frames, {event['bytes'] / 1e6:.1f} MB, {event['mbps']:.1f} MB/s"
+    if event["fraction"] is not None:
+        line += f", {event['fraction'] * 100:.0f}%"
+    if event["eta"] is not None and not event["done"]:
+        line += f", eta {event['eta']:.0f}s"
+    sys.stderr.write(line + ("\n" if event["done"] else ""))
+    sys.stderr.flush()
+
+def run_job(job, progress=None):
+    """Run one job dict (see the batch format above) and return its result."""
+    if job.get("profile"):
+        return index.run_profiled(job["profile"], run_job, dict(job, profile=None), progress)
+    command = job.get("command")
+    if command == "inspect":
+        return index.inspect(job["video"])
+    if command == "verify":
+        return index.verify(job["video"])
+    if command not in COMMANDS:
+        raise ValueError(f"Unknown command {command!r}; choose from {', '.join(COMMANDS)}.")
+
+    settings = job_settings(job.get("settings"), job.get("settings_file"), job.get("set", ()))
+    timings = {} if job.get("timings") else None
+    if command == "append":
+        if not job.get("video") or not job.get("inputs"):
+            raise ValueError("append needs a video and inputs.")
+        result = {"output": index.append(job["video"], job["inputs"], settings, progress, timings=timings)}
+    elif command == "backup":
+        if not job.get("inputs") or not job.get("output"):
+            raise ValueError("backup needs inputs and a backup folder.")
+        result = index.backup(job["output"], job["inputs"], settings, progress, timings=timings)
+    elif command == "encode":
+        if not job.get("inputs") or not job.get("output"):
+            raise ValueError("encode needs inputs and an output path.")
+        if job.get("cover"):
+            settings["steganography"] = True
+        path = index.encode(settings, progress, inputs=job["inputs"],
+                            out_path=job["output"], cover=job.get("cover"), timings=timings)
+        result = {"output": path}
+    else:
+        if not job.get("video") or not job.get("output"):
+            raise ValueError("extract needs a video and an output folder.")
+        report = index.extract(job["video"], settings, progress, dest=job["output"], timings=timings)
+        result = {"output": job["output"], **report}
+    if timings is not None:
+        result["timings"] = timings
+    return result
+
+def batch_job(i, job):
+    """Pool worker: never raises, so one failed job doesn't stop the batch."""
+    try:
+        return {"job": i, "ok": True, "result": run_job(job)}
+    except Exception as e:
+        return {"job": i, "ok": False, "error": f"{type(e).__name__}: {e}"}
+
+def run_batch(jobs, workers=None):
+    """Run jobs on a process pool, yielding each result as it finishes.
+
+    A job waits for the jobs in its "depends_on" list and is skipped (as
+    failed) if any of them failed.
+    """
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+    pending = dict(enumerate(jobs))
+    finished = {}   # job -> ok
+    running = {}
+    with ProcessPoolExecutor(workers or os.cpu_count() or 1) as pool:
+        while pending or running:
+            ready = [i for i, job in pending.items() if all(d in finished for d in job.get("depends_on", ()))]
+            for i in ready:
+                job = pending.pop(i)
+                failed = [d for d in job.get("depends_on", ()) if not finished[d]]
+                if failed:
+                    finished[i] = False
+                    yield {"job": i, "ok": False, "error": f"Skipped: job {failed[0]} failed."}
+                else:
+                    running[pool.submit(batch_job, i, job)] = i
+            if not running:
+                if not ready:
+                    # Only jobs waiting on themselves, each other or no such job
+                    for i in sorted(pending):
+                        yield {"job": i, "ok": False, "error": "Skipped: depends_on lists a job that never runs."}
+                    return
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                finished[running.pop(future)] = result["ok"]
+                yield result
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="bitstream", description="Encode files into video and back, without the GUI.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_settings(p):
+        p.add_argument("--settings", metavar="FILE", help="JSON settings file (defaults otherwise)")
+        p.add_argument("--set", metavar="KEY=VALUE", action="append", default=[], help="override one setting")
+        p.add_argument("--timings", action="store_true", help="add a per-stage time report to the result")
+        p.add_argument("--profile", metavar="FILE", help="run under cProfile and dump the stats to FILE")
+
+    p = sub.add_parser("encode", help="encode files and folders into a video")
+    p.add_argument("inputs", nargs="+", help="files and folders to encode")
+    p.add_argument("-o", "--output", required=True, help="output video path")
+    p.add_argument("--cover", nargs="+", help="cover video(s); enables steganography")
+    add_settings(p)
+
+    p = sub.add_parser("extract", help="recover the files from a video or shard manifest")
+    p.add_argument("video")
+    p.add_argument("-o", "--output", required=True, help="folder to extract into")
+    add_settings(p)
+
+    p = sub.add_parser("append", help="add files to an encoded video without re-encoding it")
+    p.add_argument("video", help="encoded video, or its chain manifest after the first append")
+    p.add_argument("inputs", nargs="+", help="files and folders to add")
+    add_settings(p)
+
+    p = sub.add_parser("backup", help="incremental backup: encode only what changed since the last run")
+    p.add_argument("inputs", nargs="+", help="files and folders to back up")
+    p.add_argument("-o", "--output", required=True, help="backup folder (videos, manifests and chunk index)")
+    add_settings(p)
+
+    p = sub.add_parser("inspect", help="describe a video without extracting it")
+    p.add_argument("video")
+
+    p = sub.add_parser("verify", help="check every payload frame's checksum")
+    p.add_argument("video")
+
+    p = sub.add_parser("batch", help="run a JSON list of jobs on a process pool")
+    p.add_argument("jobs", help="JSON file with a list of jobs")
+    p.add_argument("--workers", type=int, help="parallel jobs (default: CPU count)")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.command == "batch":
+        with open(args.jobs) as f:
+            jobs = json.load(f)
+        failed = 0
+        for result in run_batch(jobs, args.workers):
+            failed += not result["ok"]
+            print(json.dumps(result), flush=True)
+        return 1 if failed else 0
+
+    job = {k: v for k, v in vars(args).items() if v is not None}
+    job["settings_file"] = job.pop("settings", None)
+    progress = print_progress if sys.stderr.isatty() else None
+    try:
+        result = run_job(job, progress)
+    except (ValueError, FileNotFoundError, RuntimeError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(result, indent=4, default=str))
+    if args.command == "verify" and not result["ok"]:
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,245 @@
+import numpy as np
+
+# =====================================================
+# FORWARD ERROR CORRECTION
+# =====================================================
+#
+# Lossy codecs (MJPEG, MPEG-4, H.264) never return the exact pixel values
+# that were written, so this layer trades capacity for robustness:
+#
+#   1. Each BxB block of gray pixels carries one symbol of b bits as one of
+#      2**b evenly spaced gray values, which survives chroma subsampling and
+#      quantisation; decoding rounds the block mean to the nearest value.
+#      Symbols are Gray coded, so a block read one step off costs one bit.
+#   2. Frame bytes are protected by Reed-Solomon codewords over GF(256),
+#      interleaved across the frame so a damaged region only costs each
+#      codeword a few symbols.
+#
+# Encoding and syndrome checks are vectorized across all codewords of a
+# frame; only codewords that actually contain errors go through the
+# (scalar) Berlekamp-Massey / Chien / Forney correction.
+
+# Redundancy level -> (block size in pixels, bits per block, parity bytes
+# per codeword), cheapest output first. Measured over 60 frames at 512x512:
+# an MJPG frame codes a flat 8x8 block as little more than its DC value, so
+# 64 gray levels per block (level 1) make video only ~2x the payload with
+# no misread blocks, but XVID/mp4v motion prediction misreads most of them
+# (and any single-pixel block with more than 2 levels). Single-pixel
+# black/white blocks (levels 2-3) were never misread by MJPG, XVID or mp4v
+# and cost ~6x; black/white 8x8 blocks (level 4) are the most robust and
+# cost ~14-22x.
+LEVELS = {
+    1: (8, 6, 32),
+    2: (1, 1, 32),
+    3: (1, 1, 64),
+    4: (8, 1, 64),
+}
+# Levels only intra-frame codecs (every frame coded on its own) carry intact
+INTRA_LEVELS = {1}
+
+# GF(256) with primitive polynomial x^8 + x^4 + x^3 + x^2 + 1 and generator 2
+EXP = [0] * 512
+LOG = [0] * 256
+_x = 1
+for _i in range(255):
+    EXP[_i] = _x
+    LOG[_x] = _i
+    _x <<= 1
+    if _x & 0x100:
+        _x ^= 0x11d
+for _i in range(255, 512):
+    EXP[_i] = EXP[_i - 255]
+
+_exp = np.array(EXP, dtype=np.int32)
+_log = np.array(LOG, dtype=np.int32)
+# Full multiplication table, so products of whole arrays are one lookup
+MUL = np.zeros((256, 256), dtype=np.uint8)
+MUL[1:, 1:] = _exp[(_log[1:, None] + _log[None, 1:]) % 255]
+
+def gf_mul(a, b):
+    if a == 0 or b == 0:
+        return 0
+    return EXP[LOG[a] + LOG[b]]
+
+def gf_div(a, b):
+    if a == 0:
+        return 0
+    return EXP[(LOG[a] + 255 - LOG[b]) % 255]
+
+def gf_pow(x, power):
+    return EXP[(LOG[x] * power) % 255]
+
+def gf_inverse(x):
+    return EXP[255 - LOG[x]]
+
+def poly_scale(p, x):
+    return [gf_mul(c, x) for c in p]
+
+def poly_add(p, q):
+    r = [0] * max(len(p), len(q))
+    for i, c in enumerate(p):
+        r[i + len(r) - len(p)] = c
+    for i, c in enumerate(q):
+        r[i + len(r) - len(q)] ^= c
+    return r
+
+def poly_mul(p, q):
+    r = [0] * (len(p) + len(q) - 1)
+    for j, b in enumerate(q):
+        for i, a in enumerate(p):
+            r[i + j] ^= gf_mul(a, b)
+    return r
+
+def poly_eval(p, x):
+    y = p[0]
+    for c in p[1:]:
+        y = gf_mul(y, x) ^ c
+    return y
+
+def generator_poly(nsym):
+    g = [1]
+    for i in range(nsym):
+        g = poly_mul(g, [1, gf_pow(2, i)])
+    return np.array(g, dtype=np.uint8)
+
+_generators = {}
+
+def rs_encode(msgs, nsym):
+    """Append `nsym` parity bytes to each row of `msgs` (a 2-D uint8 array)."""
+    g = _generators.get(nsym)
+    if g is None:
+        g = _generators[nsym] = generator_poly(nsym)
+    # Polynomial division by g(x) as an LFSR, run on all codewords at once
+    reg = np.zeros((len(msgs), nsym), dtype=np.uint8)
+    taps = g[1:][None, :]
+    for i in range(msgs.shape[1]):
+        feedback = msgs[:, i] ^ reg[:, 0]
+        reg[:, :-1] = reg[:, 1:]
+        reg[:, -1] = 0
+        reg ^= MUL[feedback[:, None], taps]
+    return np.concatenate((msgs, reg), axis=1)
+
+def syndromes(codewords, nsym):
+    """Syndromes of each row (highest-degree coefficient first); all zero means intact."""
+    roots = np.array([gf_pow(2, i) for i in range(nsym)], dtype=np.uint8)[None, :]
+    s = np.zeros((len(codewords), nsym), dtype=np.uint8)
+    for i in range(codewords.shape[1]):
+        s = MUL[s, roots] ^ codewords[:, i:i + 1]
+    return s
+
+def error_locator(synd, nsym):
+    """Berlekamp-Massey; `synd` is the syndrome list with a leading 0 pad."""
+    err_loc = [1]
+    old_loc = [1]
+    for i in range(nsym):
+        k = i + 1
+        delta = synd[k]
+        for j in range(1, len(err_loc)):
+            delta ^= gf_mul(err_loc[-(j + 1)], synd[k - j])
+        old_loc = old_loc + [0]
+        if delta:
+            if len(old_loc) > len(err_loc):
+                new_loc = poly_scale(old_loc, delta)
+                old_loc = poly_scale(err_loc, gf_inverse(delta))
+                err_loc = new_loc
+            err_loc = poly_add(err_loc, poly_scale(old_loc, delta))
+    while err_loc and err_loc[0] == 0:
+        del err_loc[0]
+    if (len(err_loc) - 1) * 2 > nsym:
+        raise ValueError("Too many errors to correct.")
+    return err_loc
+
+def find_errors(err_loc, n):
+    """Chien search: positions (from the start of the codeword) of the errors."""
+    errs = len(err_loc) - 1
+    pos = [n - 1 - i for i in range(n) if poly_eval(err_loc, gf_pow(2, i)) == 0]
+    if len(pos) != errs:
+        raise ValueError("Too many errors to correct.")
+    return pos
+
+def correct_errata(msg, synd, err_pos):
+    """Forney algorithm: fix the symbols at `err_pos` in place."""
+    coef_pos = [len(msg) - 1 - p for p in err_pos]
+    loc = [1]
+    for i in coef_pos:
+        loc = poly_mul(loc, poly_add([1], [gf_pow(2, i), 0]))
+
+    # Error evaluator: (S(x) * loc(x)) mod x^len(loc)
+    evaluator = poly_mul(synd[::-1], loc)[-len(loc):]
+
+    X = [EXP[p] for p in coef_pos]
+    for i, Xi in enumerate(X):
+        Xi_inv = gf_inverse(Xi)
+        denom = 1
+        for j, Xj in enumerate(X):
+            if j != i:
+                denom = gf_mul(denom, 1 ^ gf_mul(Xi_inv, Xj))
+        y = gf_mul(Xi, poly_eval(evaluator, Xi_inv))
+        msg[err_pos[i]] ^= gf_div(y, denom)
+
+def rs_decode(codewords, nsym):
+    """Correct each row in place; returns the number of symbols corrected.
+
+    Raises ValueError if any codeword has more errors than the parity covers.
+    """
+    synd = syndromes(codewords, nsym)
+    corrected = 0
+    for row in np.flatnonzero(synd.any(axis=1)):
+        msg = codewords[row].tolist()
+        s = [0] + synd[row].tolist()
+        err_loc = error_locator(s, nsym)
+        err_pos = find_errors(err_loc[::-1], len(msg))
+        correct_errata(msg, s, err_pos)
+        fixed = np.array(msg, dtype=np.uint8)
+        if syndromes(fixed[None, :], nsym).any():
+            raise ValueError("Could not correct codeword.")
+        codewords[row] = fixed
+        corrected += len(err_pos)
+    return corrected
+
+def layout(width, height, level):
+    """(block size, bits per block, parity, block rows, block cols, codewords, codeword length) for a frame."""
+    block, bits, nsym = LEVELS[level]
+    rows, cols = height // block, width // block
+    usable = rows * cols * bits // 8
+    ncw = max(1, -(-usable // 255))
+    n = usable // ncw
+    return block, bits, nsym, rows, cols, ncw, n
+
+def frame_capacity(width, height, level):
+    """Bytes one frame carries at a redundancy level (0 if the frame is too small)."""
+    _, _, nsym, _, _, ncw, n = layout(width, height, level)
+    return max(0, ncw * (n - nsym))
+
+def encode_frame(data, width, height, level):
+    """Turn exactly frame_capacity() bytes into a robust BGR frame."""
+    block, bits, nsym, rows, cols, ncw, n = layout(width, height, level)
+    codewords = rs_encode(np.asarray(data, dtype=np.uint8).reshape(ncw, n - nsym), nsym)
+    # Interleave: byte i of every codeword before byte i + 1 of any
+    stream = np.zeros(rows * cols * bits, dtype=np.uint8)
+    stream[:ncw * n * 8] = np.unpackbits(codewords.T.reshape(-1))
+    symbols = np.packbits(stream.reshape(-1, bits), axis=1)[:, 0] >> (8 - bits)
+    symbols ^= symbols >> 1
+    blocks = np.rint(symbols * (255 / ((1 << bits) - 1))).astype(np.uint8).reshape(rows, cols)
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    if block > 1:
+        blocks = np.repeat(np.repeat(blocks, block, 0), block, 1)
+    frame[:rows * block, :cols * block] = blocks[:, :, None]
+    return frame
+
+def decode_frame(frame, level):
+    """Recover a frame's bytes; returns (data, symbols corrected)."""
+    height, width = frame.shape[:2]
+    block, bits, nsym, rows, cols, ncw, n = layout(width, height, level)
+    cells = frame[:rows * block, :cols * block].reshape(rows, block, cols, block, -1)
+    top = (1 << bits) - 1
+    symbols = np.rint(cells.mean(axis=(1, 3, 4)) * (top / 255)).astype(np.uint8).reshape(-1)
+    shift = 1
+    while shift < bits:   # undo the Gray code
+        symbols ^= symbols >> shift
+        shift <<= 1
+    stream = np.unpackbits((symbols << (8 - bits))[:, None], axis=1)[:, :bits].reshape(-1)
+    stream = np.packbits(stream[:ncw * n * 8])
+    codewords = np.ascontiguousarray(stream.reshape(n, ncw).T)
+    corrected = rs_decode(codewords, nsym)
+    return codewords[:, :n - nsym].reshape(-1), corrected
@@ -1,12 +1,48 @@
-import cv2
-import numpy as np
+import importlib.util
+import sys
+import functools
 import math
+import bisect
+import heapq
 import zipfile
 import shutil
 import json
 import os
+import struct
+import io
+import zlib
+import bz2
+import hashlib
+import time
+import contextlib
+from collections import deque
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import queue
 from pathlib import Path
-from tkinter import filedialog
+
+def lazy_import(name):
+    """Module that is only loaded on its first attribute access.
+
+    cv2 and numpy take ~150 ms to import, which short CLI calls (inspect,
+    verify) and every spawned pool worker would otherwise pay up front.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+fec = lazy_import("fec")
+# Only sharded encodes and process pools need these
+mp = lazy_import("multiprocessing")
 
 # =====================================================
 # BASE PATHS
@@ -18,11 +54,11 @@ OUTPUT_VIDEO = BASE / "output/encoded_video"
 OUTPUT_EXTRACT = BASE / "output/extracted_files"
 COVER_DIR = BASE / "cover_video"
 SETTINGS_FILE = BASE / "settings.json"
-TEMP_ARCHIVE = BASE / "temp_payload.zip"
 
-# Ensure directories exist
-for d in [INPUT_DIR, OUTPUT_VIDEO, OUTPUT_EXTRACT, COVER_DIR]:
-    d.mkdir(parents=True, exist_ok=True)
+def ensure_dirs():
+    """Create the default input, output and cover folders the GUI works in."""
+    for d in [INPUT_DIR, OUTPUT_VIDEO, OUTPUT_EXTRACT, COVER_DIR]:
+        d.mkdir(parents=True, exist_ok=True)
 
 # =====================================================
 # SETTINGS MANAGER
@@ -32,41 +68,70 @@ DEFAULT_SETTINGS = {
     "resolution": "256x256",
     "fps": 24,
     "steganography": False,
+    "steg_trim": False,
+    "steg_bits": 1,
+    "compression": "deflate-6",
+    "compression_target_mbps": 100,
+    "shards": 1,
+    "video_codec": "FFV1",
+    "fec_level": 0,
+    "checkpoint_frames": 0,
     "auto_sort": False
 }
 
+# Last parsed settings.json, keyed by its (mtime, size) so edits from
+# outside the app are still picked up
+settings_cache = {"stamp": None, "settings": None}
+
+def settings_stamp():
+    st = SETTINGS_FILE.stat()
+    return st.st_mtime_ns, st.st_size
+
 def load_settings():
-    """Safely load settings, restoring defaults if corrupt."""
+    """Safely load settings, restoring defaults if corrupt.
+
+    The file is only parsed again when it changed on disk; every caller
+    gets its own copy of the cached dict.
+    """
     if not SETTINGS_FILE.exists():
         save_settings(DEFAULT_SETTINGS)
-        return DEFAULT_SETTINGS
+        return dict(DEFAULT_SETTINGS)
     
     try:
-        return json.loads(SETTINGS_FILE.read_text())
+        stamp = settings_stamp()
+        if stamp != settings_cache["stamp"]:
+            settings_cache.update(stamp=stamp, settings=json.loads(SETTINGS_FILE.read_text()))
+        return dict(settings_cache["settings"])
     except (json.JSONDecodeError, OSError):
         print("Settings file corrupted. resetting defaults.")
         save_settings(DEFAULT_SETTINGS)
-        return DEFAULT_SETTINGS
+        return dict(DEFAULT_SETTINGS)
 
 def save_settings(settings):
     SETTINGS_FILE.write_text(json.dumps(settings, indent=4))
+    settings_cache.update(stamp=settings_stamp(), settings=dict(settings))
 
-def get_resolution():
-    s = load_settings()
+def get_resolution(settings=None):
+    s = load_settings() if settings is None else settings
     try:
         w, h = s["resolution"].split("x")
         return int(w), int(h)
     except:
         return 256, 256
 
-def is_steg_enabled():
-    return load_settings().get("steganography", False)
+def is_steg_enabled(settings=None):
+    s = load_settings() if settings is None else settings
+    return s.get("steganography", False)
 
 # =====================================================
 # FILE OPERATIONS
 # =====================================================
 
+# The upload dialogs import tkinter themselves, so the backend runs headless
+
 def upload_files():
+    from tkinter import filedialog
+    ensure_dirs()
     files = filedialog.askopenfilenames(title="Select files")
     if files:
         # Clear input dir first to avoid mixing previous files
@@ -79,6 +144,8 @@ def upload_files():
     return False
 
 def upload_folder():
+    from tkinter import filedialog
+    ensure_dirs()
     folder = filedialog.askdirectory(title="Select folder")
     if folder:
         # Clear input dir
@@ -93,202 +160,2783 @@ def upload_folder():
     return False
 
 def upload_cover_video():
-    video = filedialog.askopenfilename(
-        title="Select cover video",
+    from tkinter import filedialog
+    ensure_dirs()
+    videos = filedialog.askopenfilenames(
+        title="Select cover videos",
         filetypes=[("Video Files", "*.mp4 *.avi *.mkv")]
     )
-    if video:
-        # Clear old covers
+    if videos:
+        # Clear old covers; a payload too big for one cover spans all of them
         for f in COVER_DIR.glob("*"):
             f.unlink()
-        shutil.copy(video, COVER_DIR)
+        for video in videos:
+            shutil.copy(video, COVER_DIR)
         return True
     return False
 
+def save_json(path, data):
+    """Write JSON whole and swap it in, so a crash mid-write leaves the old file intact."""
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(data))
+    os.replace(tmp, path)
+
 # =====================================================
 # ZIP LOGIC
 # =====================================================
 
-def zip_input():
-    with zipfile.ZipFile(TEMP_ARCHIVE, 'w', zipfile.ZIP_DEFLATED) as z:
-        for f in INPUT_DIR.rglob("*"):
-            if f.is_file():
-                z.write(f, f.relative_to(INPUT_DIR))
+def input_files():
+    return sorted(f for f in INPUT_DIR.rglob("*") if f.is_file())
+
+def input_entries(inputs=None):
+    """(path, archive name) of every file to encode.
+
+    Without `inputs` this is the input folder. Otherwise each given file is
+    archived under its own name and each folder under its own name as the
+    top level, the same layout an upload produces.
+    """
+    if inputs is None:
+        return [(f, f.relative_to(INPUT_DIR).as_posix()) for f in input_files()]
+    entries = []
+    for p in map(Path, inputs):
+        if p.is_dir():
+            entries += [(f, f.relative_to(p.parent).as_posix()) for f in sorted(p.rglob("*")) if f.is_file()]
+        elif p.is_file():
+            entries.append((p, p.name))
+        else:
+            raise FileNotFoundError(f"No such input: {p}")
+    return entries
+
+def estimate_archive_size(entries):
+    """Upper bound on the zip size of `entries`, for capacity checks before compressing."""
+    size = 22 + 56 + 20  # end of central directory + zip64 records
+    for f, arcname in entries:
+        name = len(arcname.encode())
+        st = f.stat().st_size
+        # Local header, data descriptor and central directory entry (zip64
+        # extras included), plus worst-case codec expansion (bz2's is largest).
+        size += 30 + 24 + 46 + 28 + 2 * name + st + st // 100 + 600
+    return size
+
+# Already-compressed formats are stored as-is rather than run through deflate
+INCOMPRESSIBLE_SUFFIXES = {
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic",
+    ".mp4", ".mkv", ".avi", ".mov", ".webm",
+    ".mp3", ".aac", ".ogg", ".flac", ".m4a",
+    ".zip", ".7z", ".rar", ".gz", ".bz2", ".xz", ".zst",
+    ".docx", ".xlsx", ".pptx", ".apk", ".jar",
+}
+ENTROPY_SAMPLE = 64 * 1024
+ENTROPY_LIMIT = 7.8        # bits per byte above which deflate won't pay off
+COMPRESS_CHUNK = 1 << 20   # members are deflated in independent 1 MiB chunks
+SOLID_LIMIT = 32 << 20     # larger bz2/lzma members are compressed off the pool
+DATA_DESCRIPTOR = 0x08074b50
+
+# Payload codecs: name -> (zip method, level). The index of the name is what
+# the frame header records; zip members carry their own method for extract.
+CODECS = {
+    "store": (zipfile.ZIP_STORED, None),
+    **{f"deflate-{level}": (zipfile.ZIP_DEFLATED, level) for level in range(1, 10)},
+    "bz2": (zipfile.ZIP_BZIP2, 9),
+    "lzma": (zipfile.ZIP_LZMA, None),
+}
+CODEC_NAMES = list(CODECS)
+AUTO_CANDIDATES = ("store", "deflate-1", "deflate-6", "deflate-9", "bz2", "lzma")
+AUTO_SAMPLE = 4 << 20
+
+def get_compressor(method, level):
+    if method == zipfile.ZIP_DEFLATED:
+        return zlib.compressobj(level, zlib.DEFLATED, -15)
+    if method == zipfile.ZIP_BZIP2:
+        return bz2.BZ2Compressor(level)
+    return zipfile.LZMACompressor()
+
+def sample_input(files, limit=AUTO_SAMPLE):
+    """Up to `limit` bytes taken from the heads of the compressible input files."""
+    files = [f for f in files if not is_incompressible(f)]
+    if not files:
+        return b""
+    per_file = max(ENTROPY_SAMPLE, limit // len(files))
+    parts, total = [], 0
+    for f in files:
+        with open(f, 'rb') as fh:
+            part = fh.read(min(per_file, limit - total))
+        parts.append(part)
+        total += len(part)
+        if total >= limit: break
+    return b"".join(parts)
+
+def choose_codec(files, target_mbps, workers=None):
+    """Pick the codec with the best ratio whose throughput meets `target_mbps`.
+
+    Each candidate trial-compresses a sample of the input; throughput is
+    scaled by the worker count since members compress in parallel. If no
+    candidate is fast enough, the fastest one wins.
+    """
+    sample = sample_input(files)
+    if not sample:
+        return "store"
+    workers = workers or os.cpu_count() or 1
+
+    trials = []
+    for name in AUTO_CANDIDATES:
+        method, level = CODECS[name]
+        start = time.perf_counter()
+        if method == zipfile.ZIP_STORED:
+            size = len(sample)
+        else:
+            c = get_compressor(method, level)
+            size = len(c.compress(sample)) + len(c.flush())
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        trials.append((name, size, len(sample) / elapsed / 1e6 * workers))
+
+    fast = [t for t in trials if t[2] >= target_mbps]
+    if fast:
+        return min(fast, key=lambda t: t[1])[0]
+    return max(trials, key=lambda t: t[2])[0]
+
+def resolve_codec(settings, files):
+    name = settings.get("compression", "deflate-6")
+    if name == "auto":
+        return choose_codec(files, settings.get("compression_target_mbps", 100))
+    if name not in CODECS:
+        raise ValueError(f"Unknown compression codec {name!r}; choose from auto, {', '.join(CODEC_NAMES)}.")
+    return name
+
+def is_incompressible(path):
+    """True for known compressed formats, or when a sample of the file looks random."""
+    if path.suffix.lower() in INCOMPRESSIBLE_SUFFIXES:
+        return True
+    with open(path, 'rb') as f:
+        sample = f.read(ENTROPY_SAMPLE)
+    if len(sample) < 4096:
+        return False
+    counts = np.bincount(np.frombuffer(sample, dtype=np.uint8), minlength=256)
+    p = counts[counts > 0] / len(sample)
+    return -(p * np.log2(p)).sum() > ENTROPY_LIMIT
+
+def compress_chunk(path, offset, method, level, last):
+    """Read one chunk of a file and return (raw, compressed) bytes.
+
+    Deflated chunks are raw deflate streams ended with a sync flush, so they
+    concatenate into one valid stream; only the member's last chunk finishes it.
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        raw = f.read(COMPRESS_CHUNK)
+    if method == zipfile.ZIP_STORED:
+        return raw, raw
+    c = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return raw, c.compress(raw) + c.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+def compress_solid(path, method, level):
+    """Compress a whole file in one stream (bz2 and lzma streams can't be split)."""
+    raw = path.read_bytes()
+    c = get_compressor(method, level)
+    return raw, c.compress(raw) + c.flush()
+
+def stream_solid(path, method, level):
+    """compress_solid for large files, yielding chunks instead of holding the file."""
+    c = get_compressor(method, level)
+    with open(path, 'rb') as f:
+        while raw := f.read(COMPRESS_CHUNK):
+            yield raw, c.compress(raw)
+    yield b"", c.flush()
+
+def member_tasks(path, size, method, level):
+    """Pool tasks producing a member's (raw, compressed) chunks, or None to stream it inline."""
+    if method in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+        n = max(1, math.ceil(size / COMPRESS_CHUNK))
+        return [(compress_chunk, path, i * COMPRESS_CHUNK, method, level, i == n - 1) for i in range(n)]
+    if size <= SOLID_LIMIT:
+        return [(compress_solid, path, method, level)]
+    return None
+
+def ordered_map(pool, tasks, window):
+    """Like pool.map over (fn, *args) tasks, but keeps at most `window` in flight."""
+    pending = deque()
+    for fn, *args in tasks:
+        pending.append(pool.submit(fn, *args))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def write_member(z, zinfo, chunks, progress=None):
+    """Append a member to an open ZipFile from (raw, compressed) chunks.
+
+    Sizes and CRC go in a data descriptor after the data, so the member is
+    streamed without knowing its compressed size up front. Input bytes are
+    counted on `progress` (a Progress) as they are written, and the wait for
+    each chunk (reading and compressing) is timed as the zip_input stage.
+    """
+    zip64 = zinfo.file_size * 1.05 > zipfile.ZIP64_LIMIT
+    zinfo.flag_bits |= 0x08
+    if zinfo.compress_type == zipfile.ZIP_LZMA:
+        zinfo.flag_bits |= 0x02  # LZMA stream ends with an end-of-stream marker
+    zinfo.header_offset = z.fp.tell()
+    z.fp.write(zinfo.FileHeader(zip64))
+
+    timings = progress.timings if progress is not None else NO_TIMINGS
+    crc = size = compress_size = 0
+    for raw, data in timings.iterate("zip_input", chunks, lambda chunk: len(chunk[0])):
+        crc = zlib.crc32(raw, crc)
+        size += len(raw)
+        compress_size += len(data)
+        z.fp.write(data)
+        if progress is not None:
+            progress.add(nbytes=len(raw))
+
+    zinfo.CRC, zinfo.file_size, zinfo.compress_size = crc, size, compress_size
+    z.fp.write(struct.pack('<LLQQ' if zip64 else '<LLLL', DATA_DESCRIPTOR, crc, compress_size, size))
+    z.filelist.append(zinfo)
+    z.NameToInfo[zinfo.filename] = zinfo
+    z.start_dir = z.fp.tell()
+
+def zip_input(out, codec="deflate-6", progress=None, entries=None, keep=(), done=None):
+    """Write the input folder (or `entries`, see input_entries) as a zip archive into the file-like `out`.
+
+    `out` only needs write() and flush(), so nothing is staged on disk.
+    Members are compressed with `codec` (see CODECS) on a thread pool (zlib,
+    bz2 and lzma release the GIL) and written in order; incompressible files
+    are stored. `keep` (ZipInfos of members already written before `out`'s
+    position, see append) are listed in the central directory too. `done`,
+    a list, gets (ZipInfo, end offset) of each member once it is written.
+    """
+    if entries is None:
+        entries = input_entries()
+    files = [f for f, _ in entries]
+    workers = os.cpu_count() or 1
+    method, level = CODECS[codec]
+
+    with ThreadPoolExecutor(workers) as pool, zipfile.ZipFile(out, 'w') as z:
+        for info in keep:
+            z.filelist.append(info)
+            z.NameToInfo[info.filename] = info
+        stored = pool.map(is_incompressible, files) if method != zipfile.ZIP_STORED else [True] * len(files)
+        members = []
+        for (f, name), store in zip(entries, stored):
+            zinfo = zipfile.ZipInfo.from_file(f, name)
+            zinfo.compress_type = zipfile.ZIP_STORED if store else method
+            tasks = member_tasks(f, zinfo.file_size, zinfo.compress_type, level)
+            members.append((f, zinfo, tasks))
+
+        queued = (task for _, _, tasks in members if tasks for task in tasks)
+        results = ordered_map(pool, queued, window=2 * workers)
+
+        for f, zinfo, tasks in members:
+            if tasks is None:
+                chunks = stream_solid(f, zinfo.compress_type, level)
+            else:
+                chunks = (next(results) for _ in tasks)
+            write_member(z, zinfo, chunks, progress)
+            if done is not None:
+                done.append((zinfo, z.start_dir))
 
 # =====================================================
 # ENCODING LOGIC
 # =====================================================
 
-def encode_normal():
-    WIDTH, HEIGHT = get_resolution()
-    FPS = load_settings().get("fps", 24)
+# Every payload-carrying frame starts with a frame header, so the payload
+# can be streamed into frames without knowing its total size up front: the
+# last frame is flagged and records how many of its bytes are used.
+# Normal encodes store the header as raw bytes (8 bits per channel);
+# steganographic encodes store it in the LSB of the first HEADER_BITS
+# channel bytes, whatever bits-per-channel the body uses.
+HEADER_MAGIC = b"BSTM"
+HEADER_VERSION = 1
+# magic, version, flags, bits per channel, codec, frame seq, payload offset,
+# bytes used, CRC32 of the frame's payload bytes
+HEADER = struct.Struct(">4sBBBBIQII")
+HEADER_BITS = HEADER.size * 8
+FLAG_LAST = 1
+FLAG_TAIL = 2   # cover frame after the payload, pointing back at the last payload frame
+FLAG_FEC = 4    # header and body are Reed-Solomon protected (see fec.py)
+STEG_BITS = (1, 2, 3, 4)
 
-    zip_input()
-    payload = TEMP_ARCHIVE.read_bytes()
+# Writer fourcc -> container. Everything but FFV1 is lossy and needs FEC.
+VIDEO_CODECS = {"FFV1": ".avi", "MJPG": ".avi", "XVID": ".avi", "mp4v": ".mp4", "avc1": ".mp4"}
+# Codecs that code every frame on its own, which fec.INTRA_LEVELS need
+INTRA_CODECS = ("FFV1", "MJPG")
 
-    # Header: 8 bytes file size
-    size_header = len(payload).to_bytes(8, 'big')
-    payload = size_header + payload
+def frame_capacity(width, height, k, fec_level=0):
+    """Payload bytes carried by one frame at k bits per channel (8 = normal)."""
+    if fec_level:
+        return max(0, fec.frame_capacity(width, height, fec_level) - HEADER.size)
+    channels = width * height * 3
+    if k == 8:
+        return channels - HEADER.size
+    return (channels - HEADER_BITS) * k // 8
 
-    byte_array = np.frombuffer(payload, dtype=np.uint8)
-    
-    # Calculate capacity per frame
-    capacity = WIDTH * HEIGHT * 3
-    total_frames = math.ceil(len(byte_array) / capacity)
+def read_header(flat, k=None):
+    """Parse a frame header, returning (flags, k, codec, seq, offset, used, crc) or None.
+
+    With k unknown (the first frame), both the raw and LSB layouts are tried.
+    """
+    if k in (None, 8):
+        raw = flat[:HEADER.size].tobytes()
+        if raw.startswith(HEADER_MAGIC):
+            return unpack_header(raw)
+    if k != 8:
+        raw = np.packbits(flat[:HEADER_BITS] & 1).tobytes()
+        if raw.startswith(HEADER_MAGIC):
+            return unpack_header(raw)
+    return None
+
+def unpack_header(raw):
+    _, version, flags, k, codec, seq, offset, used, crc = HEADER.unpack(raw)
+    if version > HEADER_VERSION:
+        raise ValueError(f"Unsupported BitStream header version {version}.")
+    return flags, k, codec, seq, offset, used, crc
+
+# Byte -> its 8 bits, MSB first (np.unpackbits as a lookup table, so bytes
+# can be unpacked into a preallocated buffer with np.take). Built on first
+# use so importing this module doesn't load numpy.
+@functools.cache
+def bit_table():
+    return np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1)
+
+def unpack_bits_into(data, out):
+    """np.unpackbits(data) written into `out`, a (len(data), 8) uint8 array."""
+    # mode="clip" keeps np.take from buffering; uint8 indices are always in range
+    return np.take(bit_table(), data, axis=0, out=out, mode="clip")
+
+def bits_to_symbols_into(bits, k, out):
+    """Group len(out) * k bits into k-bit values (MSB first), in place in `out`."""
+    groups = bits.reshape(-1, k)
+    np.copyto(out, groups[:, 0])
+    for i in range(1, k):
+        out <<= 1
+        out |= groups[:, i]
+    return out
+
+def bits_to_symbols(bits, k):
+    """Group a bit array into k-bit values (MSB first), zero-padding the tail."""
+    pad = -len(bits) % k
+    if pad:
+        bits = np.concatenate((bits, np.zeros(pad, dtype=np.uint8)))
+    return bits_to_symbols_into(bits, k, np.empty(len(bits) // k, dtype=np.uint8))
+
+@functools.cache
+def symbol_table(k):
+    """Lookup tables that pack bytes straight into k-bit symbols.
+
+    Symbols line up with bytes every g = lcm(8, k) / 8 bytes. Entry [p, v]
+    holds the symbols of a g-byte group whose byte p is v and whose other
+    bytes are zero, so a group's symbols are the OR of g lookups.
+    """
+    g = math.lcm(8, k) // 8
+    table = np.zeros((g, 256, g * 8 // k), dtype=np.uint8)
+    for p in range(g):
+        bits = np.zeros((256, g * 8), dtype=np.uint8)
+        bits[:, p * 8:(p + 1) * 8] = bit_table()
+        table[p] = bits_to_symbols(bits.reshape(-1), k).reshape(256, -1)
+    return table
+
+def symbols_to_bits(values, k):
+    """Inverse of bits_to_symbols: the low k bits of each value, MSB first."""
+    if k == 1:
+        return values & 1
+    return np.unpackbits(values.reshape(-1, 1), axis=1)[:, 8 - k:].reshape(-1)
+
+def frame_body(flat, header):
+    """The payload bytes carried by a frame, checked against the header's CRC32."""
+    _, k, _, seq, _, used, crc = header
+    if k == 8:
+        data = flat[HEADER.size:HEADER.size + used].tobytes()
+    else:
+        symbols = flat[HEADER_BITS:HEADER_BITS + math.ceil(used * 8 / k)]
+        data = np.packbits(symbols_to_bits(symbols, k)[:used * 8]).tobytes()
+    if zlib.crc32(data) != crc:
+        raise ValueError(f"Frame {seq} failed its checksum.")
+    return data
+
+def unpack_frame(frame, fec_level=0, stats=None):
+    """Flat channel bytes of a frame, undoing FEC first when the video uses it."""
+    if not fec_level:
+        return frame.reshape(-1)
+    data, corrected = fec.decode_frame(frame, fec_level)
+    if stats is not None:
+        stats["corrected"] = stats.get("corrected", 0) + corrected
+    return data
+
+def detect_frame(frame, stats=None):
+    """Header, flat bytes and FEC level of a video's first frame.
+
+    Tries the raw and LSB layouts, then each FEC level; the header is None
+    if nothing matches (a legacy video).
+    """
+    flat = frame.reshape(-1)
+    header = read_header(flat)
+    if header is not None:
+        return header, flat, 0
+    # Strongest first: a codeword with more parity is also a valid codeword
+    # of every weaker level with the same block size
+    for level in sorted(fec.LEVELS, reverse=True):
+        # Only the matching level's corrections count, not those of levels
+        # that happened to decode but hold no header
+        probe = {}
+        try:
+            data = unpack_frame(frame, level, probe)
+        except ValueError:
+            continue
+        header = read_header(data, 8)
+        if header is not None and header[0] & FLAG_FEC:
+            if stats is not None:
+                stats["corrected"] = stats.get("corrected", 0) + probe["corrected"]
+            return header, data, level
+    return None, flat, 0
+
+class FrameWriter:
+    """Write-only file object that packs incoming bytes into video frames.
+
+    Bytes are buffered in a single frame-sized body buffer and a frame is
+    written as soon as the buffer fills, so the whole payload never sits in
+    memory or on disk. All buffers are allocated up front and reused, so
+    steady-state frames allocate nothing. With `cover` (an open cv2.VideoCapture) the body is
+    embedded k bits per channel into the next cover frame; otherwise it is
+    written as raw pixels. With `fec_level` the header and body are
+    Reed-Solomon encoded into blocks that survive lossy codecs. With
+    `start_seq` the payload continues from that frame (see append).
+    """
+
+    def __init__(self, writer, width, height, k=8, cover=None, codec="deflate-6", fec_level=0, progress=None,
+                 start_seq=0):
+        self.writer = writer
+        self.progress = progress
+        self.timings = progress.timings if progress is not None else NO_TIMINGS
+        self.k = k
+        self.codec = CODEC_NAMES.index(codec)
+        self.cover = cover
+        self.fec_level = fec_level
+        self.shape = (height, width, 3)
+        self.capacity = frame_capacity(width, height, k, fec_level)
+        self.body_mask = np.uint8(0xFF ^ ((1 << k) - 1))
+        self.seq = start_seq
+        self.offset = start_seq * self.capacity
+        self.filled = 0
+
+        if fec_level:
+            # Header and body share one buffer that is FEC encoded per frame
+            self.frame = np.zeros(self.capacity + HEADER.size, dtype=np.uint8)
+            self.header = self.frame[:HEADER.size]
+            self.body = self.frame[HEADER.size:]
+        elif cover is None:
+            # Normal mode writes header and body straight into the frame buffer
+            self.frame = np.zeros(self.shape, dtype=np.uint8)
+            flat = self.frame.reshape(-1)
+            self.header = flat[:HEADER.size]
+            self.body = flat[HEADER.size:HEADER.size + self.capacity]
+        else:
+            # Cover frames are decoded into one buffer and embedded in place.
+            # The body is padded to whole symbol groups (see symbol_table).
+            self.table = symbol_table(k)
+            g, _, per_group = self.table.shape
+            groups = math.ceil(self.capacity / g)
+            self.padded = np.zeros(groups * g, dtype=np.uint8)
+            self.body = self.padded[:self.capacity]
+            self.header = np.zeros(HEADER.size, dtype=np.uint8)
+            self.cover_frame = np.empty(self.shape, dtype=np.uint8)
+            self.header_bits = np.empty((HEADER.size, 8), dtype=np.uint8)
+            self.symbols = np.empty((groups, per_group), dtype=np.uint8)
+            self.scratch = np.empty((groups, per_group), dtype=np.uint8)
+
+    def write(self, data):
+        data = np.frombuffer(data, dtype=np.uint8)
+        pos = 0
+        while pos < len(data):
+            take = min(self.capacity - self.filled, len(data) - pos)
+            self.body[self.filled:self.filled + take] = data[pos:pos + take]
+            self.filled += take
+            pos += take
+            if self.filled == self.capacity:
+                self.emit(0)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def tell(self):
+        """Payload offset of the next byte written; zipfile records member offsets from it."""
+        return self.offset + self.filled
+
+    def write_frame(self, seq, offset, data, flags=0):
+        """Emit `data` (a frame's worth at most) as payload frame `seq` at `offset`, for frames dealt out by a SpanWriter."""
+        self.seq, self.offset = seq, offset
+        self.body[:len(data)] = np.frombuffer(data, dtype=np.uint8)
+        self.filled = len(data)
+        self.emit(flags)
+
+    def close(self):
+        """Write the final (possibly partial) frame flagged as the last one."""
+        self.emit(FLAG_LAST)
+
+    def emit(self, flags):
+        used = self.filled
+        if self.fec_level:
+            flags |= FLAG_FEC
+        if self.cover is not None:
+            with self.timings.time("cover_wait"):
+                ret, frame = self.cover.read(self.cover_frame)
+            if not ret:
+                raise ValueError("Cover video ran out of frames before the payload was embedded.")
+        with self.timings.time("frame_pack", nbytes=used, frames=1):
+            frame = self.pack(flags, used, frame if self.cover is not None else None)
+        with self.timings.time("writer_wait"):
+            self.writer.write(frame)
+
+        self.seq += 1
+        self.offset += used
+        self.filled = 0
+        if self.progress is not None:
+            self.progress.add(frames=1)
+
+    def pack(self, flags, used, frame=None):
+        """Header and the first `used` body bytes as a video frame, embedded into `frame` in steganography mode."""
+        HEADER.pack_into(self.header, 0, HEADER_MAGIC, HEADER_VERSION, flags, self.k, self.codec,
+                         self.seq, self.offset, used, zlib.crc32(self.body[:used]))
+
+        if self.cover is None:
+            # Pad last chunk if needed
+            if used < self.capacity:
+                self.body[used:] = 0
+            if self.fec_level:
+                height, width = self.shape[:2]
+                return fec.encode_frame(self.frame, width, height, self.fec_level)
+            return self.frame
+        else:
+            flat = frame.reshape(-1)
+
+            # Header bits into the LSB of the first channels
+            lsb = flat[:HEADER_BITS]
+            lsb &= 254
+            lsb |= unpack_bits_into(self.header, self.header_bits).reshape(-1)
+
+            # Clear the low k bits, then set them from the payload
+            g = len(self.table)
+            groups = math.ceil(used / g)
+            self.padded[used:groups * g] = 0
+            symbols = self.symbols[:groups]
+            np.take(self.table[0], self.padded[0:groups * g:g], axis=0, out=symbols, mode="clip")
+            for p in range(1, g):
+                scratch = self.scratch[:groups]
+                np.take(self.table[p], self.padded[p:groups * g:g], axis=0, out=scratch, mode="clip")
+                symbols |= scratch
+            nsym = math.ceil(used * 8 / self.k)
+            body = flat[HEADER_BITS:HEADER_BITS + nsym]
+            body &= self.body_mask
+            body |= symbols.reshape(-1)[:nsym]
+            return frame
+
+    def copy_tail(self):
+        """Copy the rest of the cover, stamping only its final frame with a tail header.
+
+        The tail header repeats the last payload frame's header, so readers
+        find the end of the payload from the video's final frame alone. The
+        frames in between are copied untouched.
+        """
+        fields = list(HEADER.unpack(self.header))
+        fields[2] = FLAG_TAIL
+        header = HEADER.pack(*fields)
+        header_bits = np.unpackbits(np.frombuffer(header, dtype=np.uint8))
+        # Hold each frame back until the next one arrives, to know which is final
+        held = None
+        while True:
+            with self.timings.time("cover_wait"):
+                ret, frame = self.cover.read(self.cover_frame)
+            if not ret: break
+            if held is not None:
+                with self.timings.time("writer_wait"):
+                    self.writer.write(held)
+            else:
+                held = np.empty_like(frame)
+            np.copyto(held, frame)
+        if held is not None:
+            flat = held.reshape(-1)
+            flat[:HEADER_BITS] &= 254
+            flat[:HEADER_BITS] |= header_bits
+            with self.timings.time("writer_wait"):
+                self.writer.write(held)
+
+# =====================================================
+# SHARDED OUTPUT
+# =====================================================
+
+# Sharded encodes deal frames out to N writer processes in stripes of
+# consecutive frames (stripe 0 -> shard 0, stripe 1 -> shard 1, ...), since
+# the streamed payload's total size is only known at the end. A manifest
+# records the shard order, stripe length and frame counts.
+SHARD_STRIPE_BYTES = 32 << 20
+STRIPE_DECODE_BYTES = 256 << 20    # decoded stripes in flight while extracting
+MANIFEST_VERSION = 1
+
+def shard_stripe(width, height, fec_level=0):
+    """Frames per stripe: about SHARD_STRIPE_BYTES of payload, at least one frame."""
+    return max(1, SHARD_STRIPE_BYTES // frame_capacity(width, height, 8, fec_level))
+
+def write_shard(path, fourcc, fps, size, queue):
+    """Shard process: write every frame that arrives on `queue` until None."""
+    writer = cv2.VideoWriter(path, fourcc, fps, size)
+    if not writer.isOpened():
+        raise RuntimeError(f"Could not open {path} for writing.")
+    shape = (size[1], size[0], 3)
+    while (data := queue.get()) is not None:
+        writer.write(np.frombuffer(data, dtype=np.uint8).reshape(shape))
+    writer.release()
+
+class ShardWriter:
+    """VideoWriter stand-in that spreads frames over shard writer processes."""
+
+    def __init__(self, out_path, shards, fourcc, fps, size, stripe):
+        self.manifest_path = out_path.with_suffix(".json")
+        self.paths = [out_path.with_name(f"{out_path.stem}.{i:03d}{out_path.suffix}") for i in range(shards)]
+        self.stripe = stripe
+        self.frames = [0] * shards
+        self.count = 0
+        self.failed = False
+        # Fail before the payload is packed, not once every frame has been
+        # sent to writers that never opened
+        probe = cv2.VideoWriter(str(self.paths[0]), fourcc, fps, size)
+        opened = probe.isOpened()
+        probe.release()
+        if not opened:
+            self.paths[0].unlink(missing_ok=True)
+            raise RuntimeError(f"This OpenCV build cannot write {fourcc.to_bytes(4, 'little').decode()} video.")
+        self.queues = [mp.Queue(maxsize=stripe) for _ in range(shards)]
+        self.procs = [mp.Process(target=write_shard, args=(str(p), fourcc, fps, size, q), daemon=True)
+                      for p, q in zip(self.paths, self.queues)]
+        for p in self.procs:
+            p.start()
+
+    def write(self, frame):
+        shard = (self.count // self.stripe) % len(self.queues)
+        # tobytes() copies now; the caller reuses its frame buffer
+        self.put(shard, frame.tobytes())
+        self.frames[shard] += 1
+        self.count += 1
+
+    def put(self, i, item):
+        # A dead shard process would otherwise leave this waiting on its full queue forever
+        while True:
+            try:
+                self.queues[i].put(item, timeout=1)
+                return
+            except queue.Full:
+                if not self.procs[i].is_alive():
+                    self.abort()
+                    raise RuntimeError(f"The writer process for {self.paths[i].name} failed.")
+
+    def abort(self):
+        # Frames still queued are dropped: without cancel_join_thread the
+        # queues' feeder threads would block interpreter exit
+        self.failed = True
+        for q, p in zip(self.queues, self.procs):
+            q.cancel_join_thread()
+            p.terminate()
+            p.join()
+
+    def release(self):
+        if self.failed:
+            return
+        for i in range(len(self.queues)):
+            self.put(i, None)
+        for p in self.procs:
+            p.join()
+        if any(p.exitcode for p in self.procs):
+            self.abort()
+            raise RuntimeError("A shard writer process failed.")
+
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "stripe": self.stripe,
+            "frames": self.count,
+            "shards": [{"file": p.name, "frames": n, "bytes": p.stat().st_size}
+                       for p, n in zip(self.paths, self.frames)],
+        }
+        self.manifest_path.write_text(json.dumps(manifest, indent=4))
+
+def decode_stripe(path, start, count, seq, fec_level=0):
+    """Decode `count` frames of a shard from frame `start`.
+
+    Returns their payload bytes and the number of symbols FEC corrected.
+    """
+    cap = cv2.VideoCapture(str(path))
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    chunks = []
+    stats = {"corrected": 0}
+    try:
+        for i in range(count):
+            ret, frame = cap.read()
+            if not ret:
+                raise ValueError(f"{path.name} ended at frame {start + i}.")
+            flat = unpack_frame(frame, fec_level, stats)
+            header = read_header(flat)
+            if header is None or header[3] != seq + i:
+                raise ValueError(f"{path.name} frame {start + i} is not payload frame {seq + i}.")
+            chunks.append(frame_body(flat, header))
+            if header[0] & FLAG_LAST: break
+    finally:
+        cap.release()
+    return b"".join(chunks), stats["corrected"]
+
+def load_manifest(manifest_path):
+    manifest = json.loads(Path(manifest_path).read_text())
+    if manifest.get("version", 0) > MANIFEST_VERSION:
+        raise ValueError(f"Unsupported manifest version {manifest['version']}.")
+    return manifest
+
+def shard_position(seq, stripe, shards):
+    """(shard index, frame index within that shard) of payload frame `seq`."""
+    n = seq // stripe
+    return n % shards, (n // shards) * stripe + seq % stripe
+
+def read_manifest_payload(manifest_path, stats=None, progress=None):
+    """Yield the payload of a shard set or an appended chain, decoding runs of frames on a process pool.
+
+    Cover spans (see SpanWriter) are read by read_span_payload.
+    """
+    if load_manifest(manifest_path).get("kind") == "span":
+        yield from read_span_payload(manifest_path, stats, progress)
+        return
+    with PayloadReader(manifest_path) as f:
+        runs = list(f.frame_runs(f.last + 1, shard_stripe(f.width, f.height, f.fec_level)))
+        fec_level = f.fec_level
+
+    tasks = ((decode_stripe, *run, fec_level) for run in runs)
+    # Every result is a whole stripe, so the stripes in flight are capped by
+    # bytes rather than by core count
+    window = max(2, STRIPE_DECODE_BYTES // SHARD_STRIPE_BYTES)
+    workers = min(os.cpu_count() or 1, window)
+    timings = progress.timings if progress is not None else NO_TIMINGS
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        results = ordered_map(pool, tasks, window=window)
+        for run, (data, corrected) in zip(runs, timings.iterate("stripe_decode", results, lambda r: len(r[0]))):
+            if stats is not None:
+                stats["corrected"] = stats.get("corrected", 0) + corrected
+            if progress is not None:
+                progress.add(frames=run[2], nbytes=len(data))
+            yield data
+
+# =====================================================
+# COVER SPANS
+# =====================================================
+
+# A payload too big for one cover is spread over several. Payload frames
+# are dealt to the covers in proportion to their frame counts (see
+# span_schedule), so every cover fills at the same rate and each one is
+# embedded by its own process, all running at once. Every frame header
+# carries its payload sequence number and offset, so extract rebuilds the
+# payload from <stem>.json, which lists the stego videos, by replaying the
+# same schedule.
+
+def span_schedule(frames):
+    """Yield the cover index of each payload frame, for covers with `frames` frames each.
+
+    Frame f of cover i is due at (f + 0.5) / frames[i] of the way through
+    the span; frames are dealt in that order, ties going to the lower index.
+    """
+    heap = [(0.5 / n, i, 0) for i, n in enumerate(frames) if n > 0]
+    heapq.heapify(heap)
+    while heap:
+        _, i, used = heapq.heappop(heap)
+        yield i
+        used += 1
+        if used < frames[i]:
+            heapq.heappush(heap, ((used + 0.5) / frames[i], i, used))
+
+def embed_cover(path, cover, k, codec, trim, queue):
+    """Span process: embed each (seq, offset, data, flags) frame arriving on `queue` into `cover` until None."""
+    cap = cv2.VideoCapture(cover)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'FFV1'), cap.get(cv2.CAP_PROP_FPS), (width, height))
+    reader = ThreadedReader(cap, (height, width, 3), stage="cover_read")
+    writer = ThreadedWriter(out, (height, width, 3))
+    try:
+        sink = FrameWriter(writer, width, height, k, cover=reader, codec=codec)
+        while (item := queue.get()) is not None:
+            sink.write_frame(*item)
+        if not trim:
+            sink.copy_tail()
+    finally:
+        reader.release()
+        writer.release()
+
+class SpanWriter:
+    """Write-only file object that deals payload frames out to one embedding process per cover.
+
+    Frames go to the covers in span_schedule order and a cover's process is
+    only started once a frame is dealt to it. A full frame is held back
+    until more bytes arrive, so close() can flag it as the last one.
+    release() writes the manifest listing the stego videos.
+    """
+
+    def __init__(self, out_path, covers, k, codec, trim, progress=None):
+        self.manifest_path = out_path.with_suffix(".json")
+        self.covers = covers
+        self.paths = [out_path.with_name(f"{out_path.stem}.{i:03d}{out_path.suffix}") for i in range(len(covers))]
+        self.k, self.codec, self.trim = k, codec, trim
+        self.progress = progress
+        self.timings = progress.timings if progress is not None else NO_TIMINGS
+        self.frames, self.capacities = [], []
+        for cover in covers:
+            cap = cv2.VideoCapture(str(cover))
+            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            self.frames.append(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+            self.capacities.append(frame_capacity(width, height, k))
+            cap.release()
+        self.capacity = sum(n * c for n, c in zip(self.frames, self.capacities))
+        self.schedule = span_schedule(self.frames)
+        self.cover = next(self.schedule, None)
+        self.used = [0] * len(covers)
+        self.queues, self.procs = {}, {}
+        self.buffer = bytearray()
+        self.seq = self.offset = 0
+        self.closed = False
+
+    def write(self, data):
+        self.buffer += data
+        while self.cover is not None and len(self.buffer) > self.capacities[self.cover]:
+            self.send(self.capacities[self.cover])
+        if self.cover is None and self.buffer:
+            raise ValueError("The covers ran out of frames before the payload was embedded.")
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def tell(self):
+        return self.offset + len(self.buffer)
+
+    def close(self):
+        """Send the held-back bytes as the last payload frame."""
+        if self.cover is None:
+            raise ValueError("The covers ran out of frames before the payload was embedded.")
+        self.send(len(self.buffer), FLAG_LAST)
+        self.closed = True
+
+    def send(self, n, flags=0):
+        i = self.cover
+        if i not in self.procs:
+            self.queues[i] = mp.Queue(maxsize=PIPELINE_DEPTH)
+            self.procs[i] = mp.Process(target=embed_cover, daemon=True,
+                                       args=(str(self.paths[i]), str(self.covers[i]), self.k, self.codec,
+                                             self.trim, self.queues[i]))
+            self.procs[i].start()
+        data = bytes(self.buffer[:n])
+        del self.buffer[:n]
+        with self.timings.time("writer_wait", nbytes=n, frames=1):
+            self.put(i, (self.seq, self.offset, data, flags))
+        self.used[i] += 1
+        self.seq += 1
+        self.offset += n
+        if self.progress is not None:
+            self.progress.add(frames=1)
+        self.cover = next(self.schedule, None)
+
+    def put(self, i, item):
+        # A process that died (say its cover had fewer frames than it claimed)
+        # would otherwise leave this waiting on its full queue forever
+        while True:
+            try:
+                self.queues[i].put(item, timeout=1)
+                return
+            except queue.Full:
+                if not self.procs[i].is_alive():
+                    raise RuntimeError(f"Embedding into {self.covers[i].name} failed.")
+
+    def release(self):
+        if not self.closed:
+            # Frames still queued for the processes are dropped, not flushed
+            for i, p in self.procs.items():
+                self.queues[i].cancel_join_thread()
+                p.terminate()
+                p.join()
+            return
+        for i in self.queues:
+            self.put(i, None)
+        for p in self.procs.values():
+            p.join()
+        if any(p.exitcode for p in self.procs.values()):
+            raise RuntimeError("A cover embedding process failed.")
+
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "kind": "span",
+            "bits": self.k,
+            "frames": self.seq,
+            "videos": [{"file": p.name, "cover": c.name, "cover_frames": n, "frames": used}
+                       for p, c, n, used in zip(self.paths, self.covers, self.frames, self.used) if used],
+        }
+        self.manifest_path.write_text(json.dumps(manifest, indent=4))
+
+def read_span_payload(manifest_path, stats=None, progress=None):
+    """Yield the payload of a cover span, taking each frame from the video the schedule dealt it to."""
+    manifest = load_manifest(manifest_path)
+    folder = Path(manifest_path).parent
+    timings = progress.timings if progress is not None else NO_TIMINGS
+    readers = []
+    try:
+        for video in manifest["videos"]:
+            cap = cv2.VideoCapture(str(folder / video["file"]))
+            shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), 3)
+            readers.append(ThreadedReader(cap, shape, timings=timings))
+        schedule = span_schedule([video["cover_frames"] for video in manifest["videos"]])
+        offset = 0
+        for seq in range(manifest["frames"]):
+            i = next(schedule, None)
+            if i is None:
+                raise ValueError(f"{Path(manifest_path).name} lists fewer frames than its payload.")
+            with timings.time("reader_wait"):
+                ret, frame = readers[i].read()
+            if not ret:
+                raise ValueError(f"{manifest['videos'][i]['file']} ended before payload frame {seq}.")
+            with timings.time("frame_unpack", frames=1):
+                flat = frame.reshape(-1)
+                header = read_header(flat, manifest["bits"])
+                if header is None or header[3] != seq or header[4] != offset:
+                    raise ValueError(f"Frame {seq} is missing or out of sequence.")
+                data = frame_body(flat, header)
+            if progress is not None:
+                progress.add(frames=1, nbytes=len(data))
+            yield data
+            offset += len(data)
+    finally:
+        for reader in readers:
+            reader.release()
+
+def span_sequences(manifest):
+    """The payload frame numbers each video of a span holds, in the order it holds them."""
+    seqs = [[] for _ in manifest["videos"]]
+    schedule = span_schedule([video["cover_frames"] for video in manifest["videos"]])
+    for seq, i in zip(range(manifest["frames"]), schedule):
+        seqs[i].append(seq)
+    return seqs
+
+def verify_span_video(path, k, seqs):
+    """Check the payload frames of one span video, which holds payload frames `seqs`.
+
+    Returns the failing payload frame numbers and (seq, offset, length) of
+    the rest, so the caller can check that offsets run on across videos.
+    """
+    cap = cv2.VideoCapture(str(path))
+    bad, good = [], []
+    try:
+        for i, seq in enumerate(seqs):
+            ret, frame = cap.read()
+            if not ret:
+                bad.extend(seqs[i:])
+                break
+            flat = frame.reshape(-1)
+            header = read_header(flat, k)
+            try:
+                if header is None or header[3] != seq:
+                    raise ValueError
+                good.append((seq, header[4], len(frame_body(flat, header))))
+            except ValueError:
+                bad.append(seq)
+    finally:
+        cap.release()
+    return bad, good
+
+# =====================================================
+# CHECKPOINTS
+# =====================================================
+
+# Long jobs keep a small journal so a restarted job resumes instead of
+# starting over. A checkpointed encode writes its video as segment files of
+# checkpoint_frames frames; each closed segment is committed to the journal
+# along with the archive members that lie wholly in the committed frames.
+# A rerun with the same inputs and settings lists those members in the new
+# central directory as they are (the way append keeps old members) and
+# regenerates the archive from the first uncommitted member, passing on only
+# the bytes past the committed frames. The segments form a chain (see
+# append), so <stem>.json stands in for the video. Extract journals the
+# payload offset after the last member it wrote, and a rerun into the same
+# folder seeks there.
+JOURNAL_VERSION = 1
+JOURNAL_INTERVAL = 5.0     # seconds between extract journal commits
+EXTRACT_JOURNAL = ".bitstream-extract.journal"
+
+def load_journal(path, job):
+    """The journal at `path` if it was written for `job` (a JSON-able dict), else None."""
+    path = Path(path)
+    if not path.exists():
+        return None
+    try:
+        journal = json.loads(path.read_text())
+    except (json.JSONDecodeError, OSError):
+        return None
+    if journal.get("version", 0) > JOURNAL_VERSION or journal.get("job") != job:
+        return None
+    return journal
+
+def sync_file(path):
+    """Flush a closed file to disk, so the journal never gets ahead of the data."""
+    fd = os.open(path, os.O_RDWR)   # Windows only flushes handles open for writing
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def member_record(info, end):
+    """Journal record of a written archive member ending at payload offset `end`."""
+    return [info.filename, info.compress_type, info.flag_bits, info.CRC, info.compress_size,
+            info.file_size, info.header_offset, end]
+
+def member_info(record, path):
+    """ZipInfo of a committed member, from its journal record and its file."""
+    name, compress_type, flags, crc, compress_size, size, offset, _ = record
+    info = zipfile.ZipInfo.from_file(path, name)
+    info.compress_type, info.flag_bits, info.CRC = compress_type, flags, crc
+    info.compress_size, info.file_size, info.header_offset = compress_size, size, offset
+    return info
+
+class SegmentWriter:
+    """VideoWriter stand-in that starts a new segment file every `frames` frames.
+
+    Segments are named <stem>.partNNN<suffix> and continue the closed
+    `segments` from payload frame `seq`. Each time a full segment is closed
+    and flushed to disk, `commit(segments)` is called on the writer thread.
+    The segment closed by release() is not committed.
+    """
+
+    def __init__(self, out_path, fourcc, fps, size, frames, commit, segments=(), seq=0):
+        self.out_path = out_path
+        self.fourcc, self.fps, self.size = fourcc, fps, size
+        self.frames = frames
+        self.commit = commit
+        self.segments = list(segments)
+        self.seq = seq
+        self.count = 0
+        self.open()
+
+    def path(self):
+        return self.out_path.with_name(f"{self.out_path.stem}.part{len(self.segments):03d}{self.out_path.suffix}")
+
+    def open(self):
+        self.video = cv2.VideoWriter(str(self.path()), self.fourcc, self.fps, self.size)
+        if not self.video.isOpened():
+            raise RuntimeError(f"This OpenCV build cannot write {self.path().name}.")
+
+    def write(self, frame):
+        if self.video is None:
+            self.open()
+        self.video.write(frame)
+        self.count += 1
+        if self.count == self.frames:
+            self.close_segment()
+            self.commit(self.segments)
+
+    def close_segment(self):
+        path = self.path()
+        self.video.release()
+        sync_file(path)
+        self.segments.append({"file": path.name, "start": self.seq, "frames": self.count})
+        self.seq += self.count
+        self.video, self.count = None, 0
+
+    def release(self):
+        if self.video is not None:
+            if self.count:
+                self.close_segment()
+            else:
+                self.video.release()
+                self.path().unlink(missing_ok=True)
+                self.video = None
+
+class ResumeWriter:
+    """Write-only file object that regenerates an archive from payload offset
+    `pos`, passing on to `out` only the bytes from offset `skip` on."""
+
+    def __init__(self, out, pos, skip):
+        self.out = out
+        self.pos = pos
+        self.skip = skip
+
+    def write(self, data):
+        n = len(data)
+        if self.pos + n > self.skip:
+            self.out.write(memoryview(data)[max(self.skip - self.pos, 0):])
+        self.pos += n
+        return n
+
+    def flush(self):
+        pass
+
+    def tell(self):
+        return self.pos
+
+# =====================================================
+# PIPELINE
+# =====================================================
+
+# Encode and extract run as pipelines: cover/video decoding, the numpy
+# transform and video encoding/file writing each get their own thread,
+# joined by bounded queues. OpenCV, numpy, zlib and file I/O release the
+# GIL, so throughput approaches the slowest stage instead of the sum.
+# Frames travel in a fixed ring of PIPELINE_DEPTH preallocated buffers.
+PIPELINE_DEPTH = 4
+
+class Stage:
+    """Call `fn(item)` on a background thread for each item put on a bounded queue."""
+
+    def __init__(self, fn, depth=PIPELINE_DEPTH):
+        self.fn = fn
+        self.queue = queue.Queue(maxsize=depth)
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while (item := self.queue.get()) is not None:
+            # Keep consuming after a failure so producers never block on a
+            # dead stage; the first error is raised on the next put or close
+            try:
+                self.fn(item)
+            except Exception as e:
+                if self.error is None:
+                    self.error = e
+
+    def put(self, item):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(item)
+
+    def close(self):
+        """Wait for every queued item, re-raising the first failure."""
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+class ThreadedWriter:
+    """VideoWriter wrapper that encodes frames on a writer thread.
+
+    Time spent in writer.write is recorded on `timings` as video_write.
+    """
+
+    def __init__(self, writer, shape, depth=PIPELINE_DEPTH, timings=None):
+        self.writer = writer
+        self.timings = NO_TIMINGS if timings is None else timings
+        self.free = queue.Queue()
+        for _ in range(depth):
+            self.free.put(np.empty(shape, dtype=np.uint8))
+        self.stage = Stage(self.write_buffer, depth)
+
+    def write_buffer(self, buf):
+        try:
+            with self.timings.time("video_write", frames=1):
+                self.writer.write(buf)
+        finally:
+            self.free.put(buf)
+
+    def write(self, frame):
+        # Copy out of the caller's buffer, which it reuses for the next frame
+        buf = self.free.get()
+        np.copyto(buf, frame)
+        self.stage.put(buf)
+
+    def release(self):
+        try:
+            self.stage.close()
+        finally:
+            self.writer.release()
+
+class ThreadedReader:
+    """VideoCapture wrapper that decodes frames ahead on a reader thread.
+
+    Time spent in cap.read is recorded on `timings` under `stage`.
+    """
+
+    def __init__(self, cap, shape, depth=PIPELINE_DEPTH, timings=None, stage="video_read"):
+        self.cap = cap
+        self.timings = NO_TIMINGS if timings is None else timings
+        self.stage = stage
+        self.free = queue.Queue()
+        self.ready = queue.Queue()
+        self.error = None
+        self.ended = False
+        for _ in range(depth):
+            self.free.put(np.empty(shape, dtype=np.uint8))
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        try:
+            while (buf := self.free.get()) is not None:
+                start = time.perf_counter()
+                ret, frame = self.cap.read(buf)
+                self.timings.add(self.stage, time.perf_counter() - start, frames=int(ret))
+                if not ret:
+                    break
+                if frame is not buf:
+                    # The video's frames are not the expected shape; hand them on as they are
+                    buf = frame
+                self.ready.put(buf)
+        except Exception as e:
+            self.error = e
+        self.ready.put(None)
+
+    def read(self, image=None):
+        """Same contract as cv2.VideoCapture.read."""
+        if self.ended:
+            return False, None
+        buf = self.ready.get()
+        if buf is None:
+            self.ended = True
+            if self.error is not None:
+                raise self.error
+            return False, None
+        if image is None or image.shape != buf.shape:
+            image = buf.copy()
+        else:
+            np.copyto(image, buf)
+        self.free.put(buf)
+        return True, image
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def release(self):
+        """Stop the reader thread, then release the capture."""
+        self.free.put(None)
+        self.thread.join()
+        self.cap.release()
+
+# =====================================================
+# PROGRESS
+# =====================================================
+
+PROGRESS_INTERVAL = 0.25   # seconds between progress events
+
+class Progress:
+    """Counts frames and bytes done and reports them to a callback.
+
+    The callback gets event dicts with stage, frames, bytes, total_bytes,
+    fraction, elapsed, mbps, eta (seconds) and done. fraction and eta are
+    None while the total is unknown. Events are throttled to one per
+    PROGRESS_INTERVAL, and the last one always has done set.
+
+    `timings` (a Timings) travels with the tracker so every stage of a run
+    can record into it; finish() adds the run's totals.
+    """
+
+    def __init__(self, callback, stage, total_bytes=None, timings=None):
+        self.callback = callback
+        self.stage = stage
+        self.timings = NO_TIMINGS if timings is None else timings
+        self.total = total_bytes
+        self.frames = 0
+        self.bytes = 0
+        self.start = time.perf_counter()
+        self.last = self.start
+
+    def add(self, frames=0, nbytes=0):
+        self.frames += frames
+        self.bytes += nbytes
+        if self.callback is None:
+            return
+        now = time.perf_counter()
+        if now - self.last >= PROGRESS_INTERVAL:
+            self.last = now
+            self.callback(self.event(now))
+
+    def finish(self):
+        now = time.perf_counter()
+        self.timings.finish(self.stage, now - self.start, self.frames, self.bytes)
+        if self.callback is not None:
+            self.callback(self.event(now, done=True))
+
+    def event(self, now, done=False):
+        elapsed = now - self.start
+        rate = self.bytes / elapsed if elapsed > 0 else 0.0
+        fraction = eta = None
+        if done:
+            fraction, eta = 1.0, 0.0
+        elif self.total:
+            fraction = min(1.0, self.bytes / self.total)
+            if rate > 0:
+                eta = max(0.0, (self.total - self.bytes) / rate)
+        return {
+            "stage": self.stage,
+            "frames": self.frames,
+            "bytes": self.bytes,
+            "total_bytes": self.total,
+            "fraction": fraction,
+            "elapsed": elapsed,
+            "mbps": rate / 1e6,
+            "eta": eta,
+            "done": done,
+        }
+
+def input_size(files):
+    return sum(f.stat().st_size for f in files)
+
+def payload_size(video_path):
+    """Payload bytes of an encoded video from its last frame header, or None for legacy videos."""
+    try:
+        with PayloadReader(video_path) as f:
+            return f.size
+    except ValueError:
+        return None
+
+# =====================================================
+# INSTRUMENTATION
+# =====================================================
+
+class Timings:
+    """Per-stage seconds, calls, bytes and frames for one encode or extract.
+
+    Fills `report` (a dict) with {"stage", "seconds", "frames", "bytes",
+    "stages": {name: {"seconds", "calls", "bytes", "frames"}}}. Stages on
+    pipeline threads overlap, so their seconds can add up to more than the
+    run's wall time; the *_wait stages are time the main thread sat blocked
+    on a pipeline thread. Without a report nothing is recorded.
+    """
+
+    def __init__(self, report=None):
+        self.report = report
+        self.lock = threading.Lock()
+        if report is not None:
+            report.setdefault("stages", {})
+
+    def add(self, stage, seconds, nbytes=0, frames=0):
+        if self.report is None:
+            return
+        with self.lock:
+            entry = self.report["stages"].setdefault(stage, {"seconds": 0.0, "calls": 0, "bytes": 0, "frames": 0})
+            entry["seconds"] += seconds
+            entry["calls"] += 1
+            entry["bytes"] += nbytes
+            entry["frames"] += frames
+
+    def time(self, stage, nbytes=0, frames=0):
+        """Context manager that adds the time spent in its block to `stage`."""
+        if self.report is None:
+            return contextlib.nullcontext()
+        return self.timed(stage, nbytes, frames)
+
+    @contextlib.contextmanager
+    def timed(self, stage, nbytes, frames):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start, nbytes, frames)
+
+    def iterate(self, stage, items, size=len):
+        """Yield from `items`, adding the wait for each one (and its size) to `stage`."""
+        if self.report is None:
+            yield from items
+            return
+        items = iter(items)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(items)
+            except StopIteration:
+                return
+            self.add(stage, time.perf_counter() - start, size(item))
+            yield item
+
+    def finish(self, stage, seconds, frames, nbytes):
+        if self.report is not None:
+            self.report.update(stage=stage, seconds=seconds, frames=frames, bytes=nbytes)
+
+NO_TIMINGS = Timings()
+
+def run_profiled(path, fn, *args, **kwargs):
+    """Call fn(*args, **kwargs) under cProfile and dump the stats to `path`.
+
+    Threads started during the call (pipeline stages, compression pool) get
+    a profiler each, merged into the dump; process pool workers are not
+    profiled. Read the dump with pstats or snakeviz.
+    """
+    import cProfile
+    import pstats
+    profilers = []
+
+    def start_thread_profiler(frame, event, arg):
+        sys.setprofile(None)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            return  # Python 3.12+ profiles every thread from the main profiler
+        profilers.append(profiler)
+
+    main = cProfile.Profile()
+    threading.setprofile(start_thread_profiler)
+    main.enable()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        main.disable()
+        threading.setprofile(None)
+        stats = pstats.Stats(main)
+        for profiler in profilers:
+            stats.add(profiler)
+        stats.dump_stats(str(path))
+
+# =====================================================
+# ENCODING ENTRY POINTS
+# =====================================================
+
+def video_params(settings):
+    """Validated (width, height, fps, video codec, fec level) for a normal encode."""
+    width, height = get_resolution(settings)
+    fps = settings.get("fps", 24)
+    video_codec = settings.get("video_codec", "FFV1")
+    fec_level = int(settings.get("fec_level", 0))
+
+    if video_codec not in VIDEO_CODECS:
+        raise ValueError(f"video_codec must be one of {list(VIDEO_CODECS)}, got {video_codec}.")
+    if fec_level and fec_level not in fec.LEVELS:
+        raise ValueError(f"fec_level must be 0 or one of {list(fec.LEVELS)}, got {fec_level}.")
+    # FFV1 is a lossless codec (crucial for data integrity); anything else
+    # alters pixels and only round-trips with forward error correction
+    if video_codec != "FFV1" and not fec_level:
+        raise ValueError(f"{video_codec} is lossy; set fec_level to encode with it.")
+    if fec_level in fec.INTRA_LEVELS and video_codec not in INTRA_CODECS:
+        raise ValueError(f"fec_level {fec_level} only survives {', '.join(INTRA_CODECS)}; "
+                         f"use a level from {sorted(set(fec.LEVELS) - fec.INTRA_LEVELS)} with {video_codec}.")
+    if frame_capacity(width, height, 8, fec_level) <= 0:
+        raise ValueError(f"{width}x{height} frames are too small for fec_level {fec_level}.")
+    return width, height, fps, video_codec, fec_level
+
+def encode_normal(settings=None, progress=None, inputs=None, out_path=None, timings=None):
+    if settings is None:
+        settings = load_settings()
+    WIDTH, HEIGHT, FPS, video_codec, fec_level = video_params(settings)
+    entries = input_entries(inputs)
+    shards = int(settings.get("shards", 1))
     
-    out_path = OUTPUT_VIDEO / "encoded.avi"
+    if out_path is None:
+        out_path = OUTPUT_VIDEO / f"encoded{VIDEO_CODECS[video_codec]}"
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    if int(settings.get("checkpoint_frames", 0)) > 0:
+        if shards > 1:
+            raise ValueError("Sharded encodes can't be checkpointed; set shards or checkpoint_frames to 0.")
+        return encode_checkpointed(settings, progress, entries, out_path, timings)
+    files = [f for f, _ in entries]
+    codec = resolve_codec(settings, files)
     
-    # FFV1 is a lossless codec (crucial for data integrity)
-    fourcc = cv2.VideoWriter_fourcc(*'FFV1')
-    video = cv2.VideoWriter(str(out_path), fourcc, FPS, (WIDTH, HEIGHT))
+    fourcc = cv2.VideoWriter_fourcc(*video_codec)
+    if shards > 1:
+        # Video encoding is the bottleneck; one writer process per shard
+        video = ShardWriter(out_path, shards, fourcc, FPS, (WIDTH, HEIGHT), shard_stripe(WIDTH, HEIGHT, fec_level))
+    else:
+        video = cv2.VideoWriter(str(out_path), fourcc, FPS, (WIDTH, HEIGHT))
+        if not video.isOpened():
+            raise RuntimeError(f"This OpenCV build cannot write {video_codec} video.")
 
-    idx = 0
-    for _ in range(total_frames):
-        chunk = byte_array[idx:idx+capacity]
-        idx += capacity
-        
-        # Pad last chunk if needed
-        if len(chunk) < capacity:
-            chunk = np.pad(chunk, (0, capacity-len(chunk)), mode='constant')
-            
-        frame = chunk.reshape((HEIGHT, WIDTH, 3)).astype(np.uint8)
-        video.write(frame)
-
-    video.release()
-    TEMP_ARCHIVE.unlink(missing_ok=True)
+    # The archive is compressed straight into frames as it is produced, and
+    # frames are encoded on a writer thread while the next ones are packed
+    tracker = Progress(progress, "encode", input_size(files), Timings(timings))
+    pipe = ThreadedWriter(video, (HEIGHT, WIDTH, 3), timings=tracker.timings)
+    try:
+        sink = FrameWriter(pipe, WIDTH, HEIGHT, codec=codec, fec_level=fec_level, progress=tracker)
+        zip_input(sink, codec, tracker, entries)
+        sink.close()
+    finally:
+        pipe.release()
+    tracker.finish()
+
+    if shards > 1:
+        return str(video.manifest_path)
     return str(out_path)
 
-def encode_steganography():
-    cover_videos = list(COVER_DIR.glob("*"))
-    if not cover_videos:
-        raise FileNotFoundError("No cover video found.")
+def encode_checkpointed(settings, progress=None, entries=None, out_path=None, timings=None):
+    """Normal encode into segments committed to <out_path>.journal as they close (see CHECKPOINTS).
 
-    cover = cover_videos[0]
-    zip_input()
-    payload = TEMP_ARCHIVE.read_bytes()
-    
-    size_header = len(payload).to_bytes(8, 'big')
-    payload = size_header + payload
-    
-    # Convert payload to bits string
-    # Optimization: using a generator or bitwise ops directly in loop is faster for huge files
-    # but this is safer for readability.
-    bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8))
-    total_bits = len(bits)
+    A rerun with the same inputs and settings resumes after the last
+    committed segment. Returns the path of the chain manifest.
+    """
+    WIDTH, HEIGHT, FPS, video_codec, fec_level = video_params(settings)
+    files = [f for f, _ in entries]
+    stats = [f.stat() for f in files]
+    job = {
+        "inputs": [[name, st.st_size, st.st_mtime_ns] for (_, name), st in zip(entries, stats)],
+        "compression": settings.get("compression", "deflate-6"),
+        "video": [WIDTH, HEIGHT, FPS, video_codec, fec_level],
+        "checkpoint_frames": int(settings["checkpoint_frames"]),
+    }
+    journal_path = out_path.with_name(out_path.name + ".journal")
+    journal = load_journal(journal_path, job)
+    if journal is None:
+        journal = {"version": JOURNAL_VERSION, "job": job, "codec": resolve_codec(settings, files),
+                   "segments": [], "members": []}
+    # The codec is the one the job started with, even if auto would now pick another
+    codec = journal["codec"]
+    capacity = frame_capacity(WIDTH, HEIGHT, 8, fec_level)
+    seq = sum(s["frames"] for s in journal["segments"])
+    done = [(member_info(record, f), record[-1]) for record, f in zip(journal["members"], files)]
+    resume = done[-1][1] if done else 0
+
+    def commit(segments):
+        committed = sum(s["frames"] for s in segments) * capacity
+        members = [member_record(info, end) for info, end in list(done) if end <= committed]
+        save_json(journal_path, dict(journal, segments=segments, members=members))
+
+    tracker = Progress(progress, "encode", input_size(files), Timings(timings))
+    tracker.add(frames=seq, nbytes=sum(st.st_size for st in stats[:len(done)]))
+    video = SegmentWriter(out_path, cv2.VideoWriter_fourcc(*video_codec), FPS, (WIDTH, HEIGHT),
+                          job["checkpoint_frames"], commit, journal["segments"], seq)
+    pipe = ThreadedWriter(video, (HEIGHT, WIDTH, 3), timings=tracker.timings)
+    try:
+        sink = FrameWriter(pipe, WIDTH, HEIGHT, codec=codec, fec_level=fec_level, progress=tracker, start_seq=seq)
+        out = ResumeWriter(sink, resume, seq * capacity)
+        zip_input(out, codec, tracker, entries[len(done):], [info for info, _ in done], done)
+        sink.close()
+    finally:
+        pipe.release()
+    tracker.finish()
+
+    manifest = {"version": MANIFEST_VERSION, "kind": "chain", "appends": 0, "segments": video.segments}
+    manifest_path = out_path.with_suffix(".json")
+    manifest_path.write_text(json.dumps(manifest, indent=4))
+    journal_path.unlink(missing_ok=True)
+    return str(manifest_path)
+
+def plan_steganography(payload_size, cover):
+    """Report how many cover frames `payload_size` bytes need at each bits-per-channel setting."""
+    cap = cv2.VideoCapture(str(cover))
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    plans = []
+    for k in STEG_BITS:
+        capacity = frame_capacity(width, height, k)
+        needed = max(1, math.ceil(payload_size / capacity)) if capacity > 0 else 0
+        plans.append({"bits": k, "frames": needed, "fits": 0 < needed <= frames})
+
+    return {"width": width, "height": height, "frames": frames,
+            "payload_size": payload_size, "plans": plans}
+
+def encode_steganography(settings=None, progress=None, inputs=None, out_path=None, cover=None, timings=None):
+    """Hide the input in `cover`, a cover video or a list of them (by default every video in the cover folder).
+
+    With more than one cover the payload is spread over all of them (see
+    COVER SPANS) and the path of the span's manifest is returned.
+    """
+    if cover is None:
+        covers = sorted(COVER_DIR.glob("*"))
+        if not covers:
+            raise FileNotFoundError("No cover video found.")
+    elif isinstance(cover, (str, os.PathLike)):
+        covers = [Path(cover)]
+    else:
+        covers = [Path(c) for c in cover]
+    if settings is None:
+        settings = load_settings()
+    k = int(settings.get("steg_bits", 1))
+    if k not in STEG_BITS:
+        raise ValueError(f"steg_bits must be one of {STEG_BITS}, got {k}.")
+
+    # The archive is compressed while it is embedded, so capacity is checked
+    # against an upper bound of its size before touching a single frame.
+    entries = input_entries(inputs)
+    files = [f for f, _ in entries]
+    codec = resolve_codec(settings, files)
+    if len(covers) > 1:
+        return encode_span(settings, progress, entries, codec, k, covers, out_path, timings)
+    cover = covers[0]
+    plan = plan_steganography(estimate_archive_size(entries), cover)
+    if not plan["plans"][k - 1]["fits"]:
+        options = ", ".join(f"{p['bits']} bit(s): {p['frames']}" for p in plan["plans"])
+        raise ValueError(f"Payload may not fit in {cover.name} ({plan['frames']} frames). "
+                         f"Frames needed per bits-per-channel setting: {options}.")
     
     cap = cv2.VideoCapture(str(cover))
     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     fps = cap.get(cv2.CAP_PROP_FPS)
     
-    out_path = OUTPUT_VIDEO / f"embedded_{cover.stem}.avi"
+    if out_path is None:
+        out_path = OUTPUT_VIDEO / f"embedded_{cover.stem}.avi"
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
     fourcc = cv2.VideoWriter_fourcc(*'FFV1')
     out = cv2.VideoWriter(str(out_path), fourcc, fps, (width, height))
     
-    bit_idx = 0
-    
-    while True:
-        ret, frame = cap.read()
-        if not ret: break
-        
-        if bit_idx < total_bits:
-            flat = frame.flatten()
-            available = len(flat)
-            needed = total_bits - bit_idx
-            
-            take = min(available, needed)
-            
-            # Embed bits into LSB
-            # Clear LSB
-            flat[:take] &= 254 
-            # Set LSB from payload
-            flat[:take] |= bits[bit_idx : bit_idx+take]
-            
-            bit_idx += take
-            frame = flat.reshape(frame.shape)
-            
-        out.write(frame)
+    # Cover decoding, embedding and FFV1 encoding each run on their own thread
+    tracker = Progress(progress, "encode", input_size(files), Timings(timings))
+    reader = ThreadedReader(cap, (height, width, 3), timings=tracker.timings, stage="cover_read")
+    writer = ThreadedWriter(out, (height, width, 3), timings=tracker.timings)
+    try:
+        sink = FrameWriter(writer, width, height, k, cover=reader, codec=codec, progress=tracker)
+        zip_input(sink, codec, tracker, entries)
+        sink.close()
 
-    cap.release()
-    out.release()
-    TEMP_ARCHIVE.unlink(missing_ok=True)
+        # With trimming on, the stego video ends at the last carrier frame instead
+        # of decoding and re-encoding the rest of the cover frame by frame.
+        if not settings.get("steg_trim", False):
+            sink.copy_tail()
+    finally:
+        reader.release()
+        writer.release()
+    tracker.finish()
     return str(out_path)
 
-def encode():
-    if is_steg_enabled():
-        return encode_steganography()
+def encode_span(settings, progress, entries, codec, k, covers, out_path=None, timings=None):
+    """Steganographic encode spread over several covers, one embedding process each. Returns the manifest's path."""
+    if out_path is None:
+        out_path = OUTPUT_VIDEO / f"embedded_{covers[0].stem}.avi"
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+
+    tracker = Progress(progress, "encode", input_size([f for f, _ in entries]), Timings(timings))
+    sink = SpanWriter(out_path, covers, k, codec, settings.get("steg_trim", False), tracker)
+    needed = estimate_archive_size(entries)
+    if needed > sink.capacity:
+        raise ValueError(f"Payload may not fit in the {len(covers)} covers: up to {needed} bytes, "
+                         f"but they hold {sink.capacity} bytes at {k} bit(s) per channel.")
+    try:
+        zip_input(sink, codec, tracker, entries)
+        sink.close()
+    finally:
+        sink.release()
+    tracker.finish()
+    return str(sink.manifest_path)
+
+def encode(settings=None, progress=None, inputs=None, out_path=None, cover=None, timings=None):
+    """Encode the input folder with `settings` (a settings dict), or the saved settings.
+
+    `progress` is called with Progress events while the input is encoded.
+    `inputs` (files and folders), `out_path` and `cover` replace the
+    input, output and cover folders, so jobs share no staging paths.
+    A `timings` dict is filled with a per-stage report (see Timings).
+    """
+    if settings is None:
+        settings = load_settings()
+    if is_steg_enabled(settings):
+        return encode_steganography(settings, progress, inputs, out_path, cover, timings)
+    else:
+        return encode_normal(settings, progress, inputs, out_path, timings)
+
+def append(video_path, inputs, settings=None, progress=None, timings=None):
+    """Add files to an encoded video (or its chain manifest) without re-encoding it.
+
+    The new members go into a segment video starting at the frame that
+    holds the old zip central directory: that frame is rewritten with the
+    bytes before the directory, then come the new members and a central
+    directory listing old and new, superseding the old one. Files with the
+    name of an archived file replace it. <stem>.json lists the segments and
+    where each starts; extract, inspect and verify take it in place of the
+    video. Segment files the new segment supersedes are deleted. Returns
+    the manifest's path.
+    """
+    if settings is None:
+        settings = load_settings()
+    path = Path(video_path)
+    if path.suffix.lower() == ".json":
+        manifest_path = path
     else:
-        return encode_normal()
+        manifest_path = path.with_suffix(".json")
+        if manifest_path.exists():
+            raise ValueError(f"{path.name} has been appended to or sharded; append to {manifest_path.name} instead.")
+    video_codec = settings.get("video_codec", "FFV1")
+    if video_codec not in VIDEO_CODECS:
+        raise ValueError(f"video_codec must be one of {list(VIDEO_CODECS)}, got {video_codec}.")
+    entries = input_entries(inputs)
+    files = [f for f, _ in entries]
+    codec = resolve_codec(settings, files)
+
+    # Only the central directory's frames are decoded
+    with PayloadReader(path) as f:
+        if f.stripe:
+            raise ValueError("Sharded videos can't be appended to.")
+        if f.k != 8:
+            raise ValueError("Steganographic videos can't be appended to.")
+        if video_codec != "FFV1" and not f.fec_level:
+            raise ValueError(f"{video_codec} is lossy and {path.name} has no FEC; append with FFV1.")
+        with zipfile.ZipFile(f) as z:
+            names = {name for _, name in entries}
+            keep = [info for info in z.infolist() if info.filename not in names]
+            start_dir = z.start_dir
+        start = start_dir // f.capacity
+        f.seek(start * f.capacity)
+        head = f.read(start_dir - start * f.capacity)
+        width, height, fps, fec_level = f.width, f.height, f.fps, f.fec_level
+        segments = f.segments
+
+    appends = load_manifest(manifest_path).get("appends", 0) + 1 if manifest_path == path else 1
+    segment_path = manifest_path.with_name(f"{manifest_path.stem}.seg{appends:03d}{VIDEO_CODECS[video_codec]}")
+    video = cv2.VideoWriter(str(segment_path), cv2.VideoWriter_fourcc(*video_codec), fps, (width, height))
+    if not video.isOpened():
+        raise RuntimeError(f"This OpenCV build cannot write {video_codec} video.")
+
+    tracker = Progress(progress, "encode", input_size(files), Timings(timings))
+    pipe = ThreadedWriter(video, (height, width, 3), timings=tracker.timings)
+    try:
+        sink = FrameWriter(pipe, width, height, codec=codec, fec_level=fec_level, progress=tracker, start_seq=start)
+        sink.write(head)
+        zip_input(sink, codec, tracker, entries, keep)
+        sink.close()
+    except BaseException:
+        try:
+            pipe.release()
+        finally:
+            segment_path.unlink(missing_ok=True)
+        raise
+    pipe.release()
+    tracker.finish()
+
+    # Segments wholly replaced by the new one drop out of the chain, and
+    # their files go once the manifest no longer lists them. The video the
+    # chain started from (<stem>.avi) is kept: it still extracts on its own.
+    superseded = [s["file"] for s in segments if s["start"] >= start and Path(s["file"]).stem != manifest_path.stem]
+    segments = [s for s in segments if s["start"] < start]
+    segments.append({"file": segment_path.name, "start": start, "frames": sink.seq - start})
+    manifest = {"version": MANIFEST_VERSION, "kind": "chain", "appends": appends, "segments": segments}
+    save_json(manifest_path, manifest)
+    for name in superseded:
+        (manifest_path.parent / name).unlink(missing_ok=True)
+    return str(manifest_path)
 
 # =====================================================
 # DECODING LOGIC
 # =====================================================
 
-def extract(video_path):
-    cap = cv2.VideoCapture(str(video_path))
-    
-    # We need to read the first 64 bits (8 bytes) to know the file size
-    # This naive implementation reads everything into memory. 
-    # For large files, a streaming approach is better, but this fits the current logic.
-    
-    extracted_bits = []
-    
+def read_payload_from(reader, offset, stats=None, progress=None):
+    """Yield the payload of an open PayloadReader from `offset` on, a frame's worth at a time."""
+    reader.seek(offset)
+    if progress is not None:
+        progress.add(nbytes=offset)
+    while data := reader.read(reader.capacity):
+        if progress is not None:
+            progress.add(frames=1, nbytes=len(data))
+        yield data
+    if stats is not None:
+        stats["corrected"] += reader.stats["corrected"]
+
+def read_payload(cap, stats=None, progress=None):
+    """Yield the payload of an open capture chunk by chunk, one frame at a time.
+
+    Reading stops at the frame flagged as last, so trailing cover frames are
+    never decoded. Symbols repaired by FEC are counted in stats["corrected"].
+    """
+    ret, frame = cap.read()
+    if not ret:
+        raise ValueError("Video has no frames.")
+
+    timings = progress.timings if progress is not None else NO_TIMINGS
+    with timings.time("frame_unpack", frames=1):
+        header, flat, fec_level = detect_frame(frame, stats)
+    if header is None:
+        yield from read_legacy_payload(cap, flat)
+        return
+
+    k = header[1]
+    seq = offset = 0
     while True:
+        flags, _, _, frame_seq, frame_offset, used, _ = header
+        if frame_seq != seq or frame_offset != offset:
+            raise ValueError(f"Frame {seq} is out of sequence.")
+
+        data = frame_body(flat, header)
+        if progress is not None:
+            progress.add(frames=1, nbytes=len(data))
+        yield data
+
+        if flags & FLAG_LAST:
+            return
+        seq += 1
+        offset += used
+
+        # Frame bytes are copied out by frame_body, so the buffer is reused
+        with timings.time("reader_wait"):
+            ret, frame = cap.read(frame)
+        if not ret:
+            raise ValueError("Video ended before the payload was complete.")
+        with timings.time("frame_unpack", frames=1):
+            flat = unpack_frame(frame, fec_level, stats)
+            header = read_header(flat, k)
+        if header is None:
+            raise ValueError(f"Frame {seq} has no BitStream header.")
+
+SEEK_GRAB_LIMIT = 16
+
+class PayloadReader(io.RawIOBase):
+    """Seekable, read-only view of a video's payload that decodes frames on demand.
+
+    Every payload frame but the last is full, so payload byte `pos` lives in
+    frame pos // capacity and any byte range maps straight to the frames that
+    carry it. Accepts a video or a shard or chain manifest (.json); in a
+    chain, each segment replaces the previous ones from its start frame on.
+    """
+
+    def __init__(self, video_path):
+        super().__init__()
+        path = Path(video_path)
+        if not path.exists():
+            raise FileNotFoundError(f"No such video: {path}")
+        self.segments = None
+        if path.suffix.lower() == ".json":
+            manifest = load_manifest(path)
+            if manifest.get("kind") == "chain":
+                self.segments = manifest["segments"]
+                self.sources = [path.parent / s["file"] for s in self.segments]
+                self.starts = [s["start"] for s in self.segments]
+                self.stripe, self.frames = None, self.starts[-1] + self.segments[-1]["frames"]
+            elif "stripe" in manifest:
+                self.sources = [path.parent / s["file"] for s in manifest["shards"]]
+                self.stripe, self.frames = manifest["stripe"], manifest["frames"]
+            elif manifest.get("kind") == "span":
+                raise ValueError(f"{path.name} spans several covers; it can only be extracted in full.")
+            else:
+                raise ValueError(f"{path.name} is not a shard or chain manifest.")
+        else:
+            self.sources, self.starts = [path], [0]
+            self.stripe, self.frames = None, None
+        self.caps = {}
+        self.next_index = {}
+        self.cached = (None, b"")
+        self.decoded = (None, None, None)
+        self.pos = 0
+        self.stats = {"corrected": 0}
+
+        frame = self.read_frame(0)
+        if frame is None:
+            raise ValueError(f"{path.name} has no frames.")
+        header, _, self.fec_level = detect_frame(frame)
+        if header is None:
+            raise ValueError(f"{path.name} has no frame headers; it can only be extracted in full.")
+        self.k = header[1]
+        self.codec = CODEC_NAMES[header[2]] if header[2] < len(CODEC_NAMES) else f"unknown ({header[2]})"
+        self.height, self.width = self.shape[:2]
+        self.fps = self.caps[0].get(cv2.CAP_PROP_FPS)
+        self.capacity = frame_capacity(self.width, self.height, self.k, self.fec_level)
+
+        self.last = self.find_last_frame()
+        _, _, _, _, offset, used, _ = self.header(self.last)
+        self.size = offset + used
+        if self.segments is None and not self.stripe:
+            self.segments = [{"file": path.name, "start": 0, "frames": self.frames}]
+
+    def read_frame(self, seq):
+        if self.stripe:
+            src, index = shard_position(seq, self.stripe, len(self.sources))
+        else:
+            src = bisect.bisect_right(self.starts, seq) - 1
+            index = seq - self.starts[src]
+        if self.decoded[:2] == (src, index):
+            # Opening a video decodes its last frame more than once
+            return self.decoded[2]
+        cap = self.caps.get(src)
+        if cap is not None and index < self.next_index[src] and index <= SEEK_GRAB_LIMIT:
+            # Rewinding near the start: reopening and grabbing forward is as
+            # cheap as a seek, and works on one-frame files OpenCV can't seek in
+            cap.release()
+            cap = None
+        if cap is None:
+            cap = self.caps[src] = cv2.VideoCapture(str(self.sources[src]))
+            self.next_index[src] = 0
+        skip = index - self.next_index[src]
+        if 0 < skip <= SEEK_GRAB_LIMIT:
+            # OpenCV seeks by rewinding and decoding forward anyway, so short
+            # hops are cheaper as grabs (decode without colour conversion)
+            for _ in range(skip):
+                cap.grab()
+        elif skip:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, index)
         ret, frame = cap.read()
-        if not ret: break
-        
-        flat = frame.flatten()
-        # Extract LSB
-        extracted_bits.append(flat & 1)
-        
-    cap.release()
-    
-    all_bits = np.concatenate(extracted_bits)
-    
-    # Reconstruct bytes
-    # Pack bits back into bytes
-    byte_data = np.packbits(all_bits)
-    
-    # Read Header (first 8 bytes)
-    size_header = byte_data[:8]
-    payload_size = int.from_bytes(size_header.tobytes(), 'big')
-    
-    # Extract payload
-    payload = byte_data[8 : 8 + payload_size].tobytes()
-    
-    archive_path = OUTPUT_EXTRACT / "recovered.zip"
-    archive_path.write_bytes(payload)
-    
-    with zipfile.ZipFile(archive_path, 'r') as zip_ref:
-        zip_ref.extractall(OUTPUT_EXTRACT)
-    
-    archive_path.unlink() # Cleanup zip
-    
-    if load_settings().get("auto_sort", False):
-        auto_sort(OUTPUT_EXTRACT)
-
-def auto_sort(folder):
-    categories = {
-        "Images": [".png", ".jpg", ".jpeg", ".webp", ".gif"],
-        "Documents": [".pdf", ".docx", ".txt", ".xlsx", ".pptx"],
-        "Programs": [".exe", ".apk", ".msi", ".bat", ".py"],
-        "Videos": [".mp4", ".mkv", ".avi", ".mov"],
-        "Audio": [".mp3", ".wav", ".flac"]
+        if not ret:
+            return None
+        self.next_index[src] = index + 1
+        self.shape = frame.shape
+        self.decoded = (src, index, frame)
+        return frame
+
+    def unpack(self, seq):
+        """Flat bytes of frame `seq` (FEC decoded), or None past the end of the video."""
+        frame = self.read_frame(seq)
+        if frame is None:
+            return None
+        return unpack_frame(frame, self.fec_level, self.stats)
+
+    def header(self, seq):
+        """Header of payload frame `seq`, or None if that frame carries no payload."""
+        flat = self.unpack(seq)
+        if flat is None:
+            return None
+        header = read_header(flat, self.k)
+        if header is None or header[3] != seq:
+            return None
+        return header
+
+    def find_last_frame(self):
+        """Index of the frame flagged last.
+
+        Normal and trimmed encodes end on it, and stego encodes that keep the
+        rest of the cover end on a tail frame pointing back at it. Otherwise
+        it is binary-searched, since frames without a header carry no payload.
+        """
+        if self.frames is None:
+            self.frames = int(self.caps[0].get(cv2.CAP_PROP_FRAME_COUNT))
+        n = self.frames
+        flat = self.unpack(n - 1)
+        header = None if flat is None else read_header(flat, self.k)
+        if header is not None and header[0] & FLAG_TAIL:
+            lo = header[3]
+            header = self.header(lo)
+        elif header is not None and header[3] == n - 1:
+            lo = n - 1
+        else:
+            lo, hi = 0, n - 1
+            while hi - lo > 1:
+                mid = (lo + hi) // 2
+                if self.header(mid) is not None:
+                    lo = mid
+                else:
+                    hi = mid
+            header = self.header(lo)
+        if not header[0] & FLAG_LAST:
+            raise ValueError("Video ended before the payload was complete.")
+        return lo
+
+    def frame_runs(self, frames, size):
+        """(source, first frame in it, count, first payload frame) runs covering payload frames [0, frames).
+
+        Shards run in their stripes; otherwise runs are at most `size` frames
+        and never cross into the next segment.
+        """
+        if self.stripe:
+            n = len(self.sources)
+            for j in range(math.ceil(frames / self.stripe)):
+                yield (self.sources[j % n], (j // n) * self.stripe,
+                       min(self.stripe, frames - j * self.stripe), j * self.stripe)
+            return
+        ends = self.starts[1:] + [frames]
+        for source, start, end in zip(self.sources, self.starts, ends):
+            end = min(end, frames)
+            for seq in range(start, end, size):
+                yield source, seq - start, min(size, end - seq), seq
+
+    def frame_data(self, seq):
+        if self.cached[0] != seq:
+            flat = self.unpack(seq)
+            header = None if flat is None else read_header(flat, self.k)
+            if header is None or header[3] != seq:
+                raise ValueError(f"Frame {seq} has no BitStream header.")
+            self.cached = (seq, frame_body(flat, header))
+        return self.cached[1]
+
+    def readinto(self, b):
+        # Fill the whole buffer across frames; zipfile treats short reads as truncation
+        filled = 0
+        while filled < len(b) and self.pos < self.size:
+            seq = self.pos // self.capacity
+            data = self.frame_data(seq)
+            start = self.pos - seq * self.capacity
+            n = min(len(b) - filled, len(data) - start)
+            b[filled:filled + n] = data[start:start + n]
+            filled += n
+            self.pos += n
+        return filled
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.pos = max(0, offset)
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def close(self):
+        for cap in self.caps.values():
+            cap.release()
+        self.caps.clear()
+        super().close()
+
+def list_members(z, capacity):
+    infos = sorted(z.infolist(), key=lambda i: i.header_offset)
+    # Members are contiguous: each one ends where the next begins
+    ends = [i.header_offset for i in infos[1:]] + [z.start_dir]
+    return [{
+        "name": info.filename,
+        "offset": info.header_offset,
+        "length": end - info.header_offset,
+        "size": info.file_size,
+        "frames": (info.header_offset // capacity, (end - 1) // capacity),
+    } for info, end in zip(infos, ends)]
+
+def file_table(video_path):
+    """List the archived files with their payload byte range and frame range.
+
+    The zip central directory at the end of the payload is the file table;
+    only the last frames and the central directory's frames are decoded.
+    """
+    with PayloadReader(video_path) as f, zipfile.ZipFile(f) as z:
+        return list_members(z, f.capacity)
+
+def inspect(video_path):
+    """Describe an encoded video without extracting it.
+
+    Only the first frame, the last payload frame and the frames holding the
+    zip central directory are decoded. Cover spans are described from their
+    manifest and first frame alone (see inspect_span).
+    """
+    if is_span(video_path):
+        return inspect_span(video_path)
+    with PayloadReader(video_path) as f, zipfile.ZipFile(f) as z:
+        return {
+            "mode": "normal" if f.k == 8 else "steganography",
+            "bits_per_channel": f.k,
+            "fec_level": f.fec_level,
+            "codec": f.codec,
+            "width": f.width,
+            "height": f.height,
+            "fps": f.fps,
+            "shards": len(f.sources) if f.stripe else 1,
+            "segments": 1 if f.stripe else len(f.sources),
+            "video_frames": f.frames,
+            "payload_frames": f.last + 1,
+            "payload_size": f.size,
+            "files": list_members(z, f.capacity),
+        }
+
+def is_span(video_path):
+    path = Path(video_path)
+    return path.suffix.lower() == ".json" and load_manifest(path).get("kind") == "span"
+
+def inspect_span(manifest_path):
+    """Describe a cover span from its manifest and the header of its first frame.
+
+    The archive's members are spread over every video, so they are not
+    listed; only a full extract reads them.
+    """
+    manifest = load_manifest(manifest_path)
+    folder = Path(manifest_path).parent
+    seqs = span_sequences(manifest)
+    videos, header = [], None
+    for video, video_seqs in zip(manifest["videos"], seqs):
+        cap = cv2.VideoCapture(str(folder / video["file"]))
+        if not cap.isOpened():
+            raise FileNotFoundError(f"No such video: {folder / video['file']}")
+        if header is None and video_seqs:
+            ret, frame = cap.read()
+            header = read_header(frame.reshape(-1), manifest["bits"]) if ret else None
+            if header is None or header[3] != video_seqs[0]:
+                cap.release()
+                raise ValueError(f"{video['file']} does not start with payload frame {video_seqs[0]}.")
+        videos.append({
+            "file": video["file"],
+            "cover": video["cover"],
+            "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "fps": cap.get(cv2.CAP_PROP_FPS),
+            "video_frames": video["cover_frames"],
+            "payload_frames": video["frames"],
+        })
+        cap.release()
+    return {
+        "mode": "steganography",
+        "bits_per_channel": manifest["bits"],
+        "fec_level": 0,
+        "codec": CODEC_NAMES[header[2]] if header[2] < len(CODEC_NAMES) else f"unknown ({header[2]})",
+        "covers": videos,
+        "payload_frames": manifest["frames"],
     }
-    
-    for file in folder.iterdir():
-        if file.is_file():
-            found = False
-            for cat, exts in categories.items():
-                if file.suffix.lower() in exts:
-                    target = folder / cat
-                    target.mkdir(exist_ok=True)
-                    try: shutil.move(str(file), target / file.name)
-                    except: pass 
-                    found = True
-                    break
-            if not found:
-                target = folder / "Others"
-                target.mkdir(exist_ok=True)
-                try: shutil.move(str(file), target / file.name)
-                except: pass
\ No newline at end of file
+
+def extract_file(video_path, name, dest=None):
+    """Extract a single archived file, decoding only the frames that hold it."""
+    with PayloadReader(video_path) as f, zipfile.ZipFile(f) as z:
+        return z.extract(name, dest or OUTPUT_EXTRACT)
+
+def verify_stripe(path, start, count, seq, fec_level=0):
+    """Check `count` frames of a video from frame `start`.
+
+    Returns the failing payload frame numbers and the symbols FEC corrected.
+    """
+    cap = cv2.VideoCapture(str(path))
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    bad = []
+    stats = {"corrected": 0}
+    try:
+        for i in range(count):
+            ret, frame = cap.read()
+            if not ret:
+                bad.extend(range(seq + i, seq + count))
+                break
+            try:
+                flat = unpack_frame(frame, fec_level, stats)
+                header = read_header(flat)
+                if header is None or header[3] != seq + i:
+                    raise ValueError
+                frame_body(flat, header)
+            except ValueError:
+                bad.append(seq + i)
+    finally:
+        cap.release()
+    return bad, stats["corrected"]
+
+def verify(video_path):
+    """Check every payload frame against its CRC32 on a process pool.
+
+    Nothing is written to disk. Accepts a video or a shard, chain or span
+    manifest (.json) and returns the payload frame count, the frames that
+    failed and the symbols FEC corrected.
+    """
+    if is_span(video_path):
+        return verify_span(video_path)
+    with PayloadReader(video_path) as f:
+        frames, fec_level = f.last + 1, f.fec_level
+        workers = os.cpu_count() or 1
+        # Shards fix the stripe layout; a single video is split evenly so
+        # each worker seeks only once.
+        runs = list(f.frame_runs(frames, math.ceil(frames / workers)))
+
+    tasks = ((verify_stripe, *run, fec_level) for run in runs)
+    bad, corrected = [], 0
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        for result, fixed in ordered_map(pool, tasks, window=2 * workers):
+            bad.extend(result)
+            corrected += fixed
+    return {"frames": frames, "bad_frames": bad, "corrected": corrected, "ok": not bad}
+
+def verify_span(manifest_path):
+    """verify() for a cover span: each video is checked by its own worker.
+
+    Frames are checked against the span schedule and their CRC32, and their
+    offsets must run on from the frame before across videos.
+    """
+    manifest = load_manifest(manifest_path)
+    folder = Path(manifest_path).parent
+    seqs = span_sequences(manifest)
+    # Frames the covers have no room for in the schedule
+    bad = set(range(manifest["frames"])) - {seq for video in seqs for seq in video}
+    tasks = [(verify_span_video, folder / video["file"], manifest["bits"], video_seqs)
+             for video, video_seqs in zip(manifest["videos"], seqs) if video_seqs]
+    found = {}
+    workers = min(os.cpu_count() or 1, max(1, len(tasks)))
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        for result, good in ordered_map(pool, tasks, window=2 * workers):
+            bad.update(result)
+            found.update((seq, (offset, length)) for seq, offset, length in good)
+    offset = 0
+    for seq in range(manifest["frames"]):
+        if seq in bad:
+            offset = None   # length unknown; resume checking after the next good frame
+            continue
+        start, length = found[seq]
+        if offset is not None and start != offset:
+            bad.add(seq)
+        offset = start + length
+    return {"frames": manifest["frames"], "bad_frames": sorted(bad), "corrected": 0, "ok": not bad}
+
+def read_legacy_payload(cap, flat):
+    """Payload of videos written before frame headers: 8-byte size, 1 bit per channel."""
+    payload_size = None
+    remaining = 0
+    carry = np.empty(0, dtype=np.uint8)
+
+    while True:
+        if payload_size is not None:
+            # Only decode the channels that still hold payload bits
+            flat = flat[:remaining * 8 - len(carry)]
+        bits = flat & 1
+        if len(carry):
+            bits = np.concatenate((carry, bits))
+
+        if payload_size is None:
+            payload_size = int.from_bytes(np.packbits(bits[:64]).tobytes(), 'big')
+            remaining = payload_size
+            bits = bits[64:]
+
+        usable = min(len(bits) // 8, remaining) * 8
+        yield np.packbits(bits[:usable]).tobytes()
+        remaining -= usable // 8
+        if not remaining:
+            return
+        carry = bits[usable:]
+
+        ret, frame = cap.read()
+        if not ret:
+            raise ValueError("Video ended before the payload was complete.")
+        flat = frame.reshape(-1)
+
+# Auto-sort sends each top-level file to a category folder, chosen by its
+# suffix, or for files without one by their first bytes
+SORT_CATEGORIES = {
+    "Images": [".png", ".jpg", ".jpeg", ".webp", ".gif"],
+    "Documents": [".pdf", ".docx", ".txt", ".xlsx", ".pptx"],
+    "Programs": [".exe", ".apk", ".msi", ".bat", ".py"],
+    "Videos": [".mp4", ".mkv", ".avi", ".mov"],
+    "Audio": [".mp3", ".wav", ".flac"]
+}
+CATEGORY_BY_SUFFIX = {ext: cat for cat, exts in SORT_CATEGORIES.items() for ext in exts}
+# (offset, magic bytes, category)
+MAGIC_CATEGORIES = [
+    (0, b"\x89PNG", "Images"), (0, b"\xff\xd8\xff", "Images"), (0, b"GIF8", "Images"), (8, b"WEBP", "Images"),
+    (0, b"%PDF", "Documents"),
+    (0, b"MZ", "Programs"), (0, b"\x7fELF", "Programs"), (0, b"#!", "Programs"),
+    (4, b"ftyp", "Videos"), (0, b"\x1a\x45\xdf\xa3", "Videos"), (8, b"AVI ", "Videos"),
+    (0, b"ID3", "Audio"), (0, b"\xff\xfb", "Audio"), (0, b"fLaC", "Audio"), (8, b"WAVE", "Audio"),
+]
+SNIFF_BYTES = 16
+
+def file_category(name, head=b""):
+    """Auto-sort folder for a file, from its suffix or else its first bytes `head`."""
+    suffix = Path(name).suffix.lower()
+    if suffix:
+        return CATEGORY_BY_SUFFIX.get(suffix, "Others")
+    for offset, magic, category in MAGIC_CATEGORIES:
+        if head[offset:offset + len(magic)] == magic:
+            return category
+    return "Others"
+
+class PayloadStream:
+    """Sequential reads over payload chunks as they are decoded."""
+
+    def __init__(self, chunks, pos=0):
+        self.chunks = iter(chunks)
+        self.chunk = memoryview(b"")
+        self.start = 0
+        self.pos = pos
+
+    def read1(self, n):
+        """Up to `n` bytes from the current chunk (no copy); empty at the end of the payload."""
+        while self.start == len(self.chunk):
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return b""
+            self.chunk, self.start = memoryview(chunk), 0
+        data = self.chunk[self.start:self.start + n]
+        self.start += len(data)
+        self.pos += len(data)
+        return data
+
+    def read(self, n):
+        parts = []
+        while n and (data := self.read1(n)):
+            parts.append(data)
+            n -= len(data)
+        return b"".join(parts)
+
+    def unread(self, n):
+        """Step back over the last `n` bytes of the last read1."""
+        self.start -= n
+        self.pos -= n
+
+LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+LOCAL_HEADER_MAGIC = b"PK\x03\x04"
+# Central directory entry, zip64 end record and end of central directory
+ARCHIVE_END_MAGICS = (b"PK\x01\x02", b"PK\x06\x06", b"PK\x05\x06")
+DESCRIPTOR_MAGIC = struct.pack("<L", DATA_DESCRIPTOR)
+MEMBER_PIECE = 64 << 10
+OPEN = object()         # writer-stage markers: open (truncate) the file,
+DISCARD = object()      # or close it and remove it
+
+def payload_members(stream, timings=NO_TIMINGS):
+    """Yield (ZipInfo, decompressed pieces) for each archive member as the payload streams past.
+
+    Members are found from their local headers, in one pass, and each one's
+    pieces must be consumed before the next is taken. Stops at the central
+    directory, or at the end records of an archive with no members.
+    """
+    while True:
+        raw = stream.read(LOCAL_HEADER.size)
+        if raw[:4] != LOCAL_HEADER_MAGIC:
+            if raw[:4] not in ARCHIVE_END_MAGICS:
+                raise ValueError("Archive member header is missing; the payload is corrupt.")
+            return
+        if len(raw) < LOCAL_HEADER.size:
+            raise ValueError("Payload ended inside an archive member header.")
+        _, _, flags, method, _, _, crc, csize, usize, name_len, extra_len = LOCAL_HEADER.unpack(raw)
+        name = stream.read(name_len)
+        extra = stream.read(extra_len)
+        info = zipfile.ZipInfo(name.decode("utf-8" if flags & 0x800 else "cp437"))
+        info.flag_bits, info.compress_type, info.CRC = flags, method, crc
+        info.compress_size, info.file_size = csize, usize
+        zip64 = zip64_sizes(info, extra)
+        if flags & 0x01:
+            raise ValueError(f"{info.filename} is encrypted.")
+        yield info, member_pieces(stream, info, zip64, timings)
+
+def zip64_sizes(info, extra):
+    """Fill in the sizes a local header defers to its zip64 extra field; True if it has one."""
+    pos = 0
+    while pos + 4 <= len(extra):
+        tag, length = struct.unpack_from("<HH", extra, pos)
+        if tag == 1:
+            values = iter(struct.unpack_from(f"<{length // 8}Q", extra, pos + 4))
+            if info.file_size == 0xFFFFFFFF:
+                info.file_size = next(values, 0)
+            if info.compress_size == 0xFFFFFFFF:
+                info.compress_size = next(values, 0)
+            return True
+        pos += 4 + length
+    return False
+
+def member_pieces(stream, info, zip64=False, timings=NO_TIMINGS):
+    """Yield the member's data, decompressed piece by piece, from the stream's position.
+
+    Members written with a data descriptor (see write_member) have no sizes
+    in their local header: their data ends at the descriptor whose
+    compressed size matches the bytes read so far, and `info` takes its CRC
+    and sizes.
+    """
+    method = info.compress_type
+    if method == zipfile.ZIP_DEFLATED:
+        decompress = zlib.decompressobj(-15).decompress
+    elif method == zipfile.ZIP_BZIP2:
+        decompress = bz2.BZ2Decompressor().decompress
+    elif method == zipfile.ZIP_LZMA:
+        decompress = zipfile.LZMADecompressor().decompress
+    elif method == zipfile.ZIP_STORED:
+        decompress = None
+    else:
+        raise ValueError(f"{info.filename} uses unsupported compression method {method}.")
+
+    def inflate(data):
+        if decompress is None:
+            return data
+        with timings.time("inflate", nbytes=len(data)):
+            return decompress(data)
+
+    if not info.flag_bits & 0x08:
+        remaining = info.compress_size
+        while remaining:
+            data = stream.read1(min(remaining, MEMBER_PIECE))
+            if not data:
+                raise ValueError(f"Payload ended inside {info.filename}.")
+            remaining -= len(data)
+            yield inflate(data)
+        return
+
+    descriptor = struct.Struct("<4sLQQ" if zip64 else "<4sLLL")
+    pending = bytearray()
+    done = 0        # bytes of the member already passed on
+    while True:
+        data = stream.read1(MEMBER_PIECE)
+        if not data:
+            raise ValueError(f"Payload ended inside {info.filename}.")
+        pending += data
+        at = pending.find(DESCRIPTOR_MAGIC)
+        while at != -1 and at + descriptor.size <= len(pending):
+            _, crc, csize, usize = descriptor.unpack_from(pending, at)
+            if csize == done + at:
+                stream.unread(len(pending) - at - descriptor.size)
+                info.CRC, info.compress_size, info.file_size = crc, csize, usize
+                if at:
+                    yield inflate(bytes(pending[:at]))
+                return
+            at = pending.find(DESCRIPTOR_MAGIC, at + 1)
+        # Hold back enough to cover a descriptor split across reads
+        keep = max(len(pending) - descriptor.size + 1, 0)
+        if keep:
+            yield inflate(bytes(pending[:keep]))
+            del pending[:keep]
+            done += keep
+
+def extract_member(info, pieces, dest, sort, writes):
+    """Write one member's pieces to its final path under `dest`, queueing the writes on `writes`.
+
+    The file is opened, written and closed on the writer thread, in queue
+    order, so a later member with the same path can't truncate it while
+    earlier writes are pending. With `sort`, top-level files go into their
+    category folder. Raises ValueError if the data doesn't match the
+    member's CRC and size, and the file is removed.
+    """
+    # Like zipfile's extract, never write outside dest
+    parts = [p for p in info.filename.replace("\\", "/").split("/") if p not in ("", ".", "..")]
+    if info.is_dir() or not parts:
+        for _ in pieces:
+            pass
+        if parts:
+            dest.joinpath(*parts).mkdir(parents=True, exist_ok=True)
+        return
+
+    # The first bytes pick the category of files without a suffix
+    pieces = iter(pieces)
+    head = b""
+    while len(head) < SNIFF_BYTES and (piece := next(pieces, None)) is not None:
+        head += piece
+    if sort and len(parts) == 1:
+        parts.insert(0, file_category(parts[0], head))
+    target = dest.joinpath(*parts)
+    target.parent.mkdir(parents=True, exist_ok=True)
+
+    crc, size = zlib.crc32(head), len(head)
+    intact = False
+    writes.put((target, OPEN))
+    try:
+        writes.put((target, head))
+        for piece in pieces:
+            crc = zlib.crc32(piece, crc)
+            size += len(piece)
+            writes.put((target, piece))
+        intact = crc == info.CRC and size == info.file_size
+    finally:
+        # Closed after its queued pieces even when the payload fails
+        # mid-member; a partial or corrupt file is then removed
+        writes.put((target, None if intact else DISCARD))
+    if not intact:
+        raise ValueError(f"{info.filename} is corrupt: its CRC or size doesn't match the archive.")
+
+def extract(video_path, settings=None, progress=None, dest=None, timings=None):
+    """Recover the files from an encoded video, or from a shard set's manifest (.json).
+
+    `settings` overrides the saved settings (only auto_sort applies) and
+    `progress` is called with Progress events as the payload is decoded.
+    Files go to `dest`, by default the extracted files folder. A `timings`
+    dict is filled with a per-stage report (see Timings). Backup manifests
+    (see backup) restore their whole tree.
+    Returns {"corrected": n}, the number of symbols repaired by FEC.
+
+    Members stream from the decoded payload straight to their final paths
+    (in their category folder with auto_sort), so no archive is staged on
+    disk and nothing is moved afterwards. Progress is journaled in `dest`
+    (see CHECKPOINTS), so an interrupted extract rerun into the same folder
+    carries on after the last member it wrote.
+    """
+    if not Path(video_path).exists():
+        raise FileNotFoundError(f"No such video: {video_path}")
+    dest = OUTPUT_EXTRACT if dest is None else Path(dest)
+    dest.mkdir(parents=True, exist_ok=True)
+    if is_backup_manifest(video_path):
+        return restore_backup(video_path, dest, progress, timings)
+    if settings is None:
+        settings = load_settings()
+    sort = settings.get("auto_sort", False)
+    st = Path(video_path).stat()
+    job = {"video": str(Path(video_path).resolve()), "size": st.st_size, "mtime_ns": st.st_mtime_ns, "auto_sort": sort}
+    journal_path = dest / EXTRACT_JOURNAL
+    journal = load_journal(journal_path, job)
+    start = journal["offset"] if journal else 0
+
+    stats = {"corrected": 0}
+    tracker = Progress(progress, "extract", payload_size(video_path) if progress else None, Timings(timings))
+    cap = reader = None
+    if start:
+        try:
+            reader = PayloadReader(video_path)
+        except ValueError:
+            start = 0   # video from before frame headers, which can't be sought
+    if reader is not None:
+        chunks = read_payload_from(reader, start, stats, tracker)
+    elif Path(video_path).suffix.lower() == ".json":
+        chunks = read_manifest_payload(video_path, stats, tracker)
+    else:
+        # Frames are decoded ahead on a reader thread
+        cap = cv2.VideoCapture(str(video_path))
+        shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), 3)
+        cap = ThreadedReader(cap, shape, timings=tracker.timings)
+        chunks = read_payload(cap, stats, tracker)
+
+    # Members are decompressed here and written on a writer thread, so disk
+    # writes overlap decoding. The journal is committed there too, once the
+    # files it vouches for are closed and on disk.
+    closed = []
+    files = {}
+    committed = time.monotonic()
+
+    def write(item):
+        nonlocal committed
+        target, data = item
+        if target is None:
+            # `data` is the payload offset after the members written so far
+            if time.monotonic() - committed >= JOURNAL_INTERVAL:
+                for name in closed:
+                    sync_file(name)
+                closed.clear()
+                save_json(journal_path, {"version": JOURNAL_VERSION, "job": job, "offset": data})
+                committed = time.monotonic()
+        elif data is OPEN:
+            files[target] = open(target, 'wb')
+        elif data is None:
+            files.pop(target).close()
+            closed.append(target)
+        elif data is DISCARD:
+            out = files.pop(target, None)
+            if out is not None:
+                out.close()
+            target.unlink(missing_ok=True)
+        else:
+            with tracker.timings.time("file_write", nbytes=len(data)):
+                files[target].write(data)
+
+    try:
+        writes = Stage(write)
+        try:
+            stream = PayloadStream(chunks, start)
+            for info, pieces in payload_members(stream, tracker.timings):
+                extract_member(info, pieces, dest, sort, writes)
+                writes.put((None, stream.pos))
+        finally:
+            writes.close()
+    finally:
+        if cap is not None:
+            cap.release()
+        if reader is not None:
+            reader.close()
+    journal_path.unlink(missing_ok=True)
+    tracker.finish()
+    return stats
+
+# =====================================================
+# INCREMENTAL BACKUP
+# =====================================================
+
+# Nightly backups of a tree that barely changes store files as
+# content-defined chunks: a chunk ends where a rolling hash of the last
+# CDC_WINDOW bytes hits a pattern, so an edit only changes the chunks around
+# it and every other chunk dedups against one already stored. Each run
+# writes only its new chunks (compressed, back to back) into a delta video,
+# plus a manifest listing every file's chunks and where each chunk lives;
+# the manifest alone (with the videos beside it) restores the full tree.
+# The backup folder's index.json maps every stored chunk to its (video,
+# frame, offset, length, codec) and remembers each file's size and mtime,
+# so unchanged files are not even read.
+BACKUP_VERSION = 1
+BACKUP_INDEX = "index.json"
+CDC_WINDOW = 48
+CDC_MIN = 64 << 10
+CDC_AVG_BITS = 18          # a boundary every 2**18 = 256 KiB on average
+CDC_MAX = 1 << 20
+CDC_READ = 8 << 20
+
+@functools.cache
+def gear_table():
+    """Fixed pseudo-random 32-bit value per byte value, for the rolling hash."""
+    return np.array([int.from_bytes(hashlib.blake2b(bytes([b]), digest_size=4).digest(), "little")
+                     for b in range(256)], dtype=np.uint32)
+
+def cdc_cuts(data, final):
+    """End offsets of the content-defined chunks that start at data[0].
+
+    The rolling hash at each byte is the sum (mod 2**32) of gear values
+    over the last CDC_WINDOW bytes, a cumulative sum differenced, so it is
+    computed for the whole buffer at once. Unless `final`, the bytes after
+    the last cut are left for the caller to prepend to the next block.
+    """
+    n = len(data)
+    sums = gear_table()[np.frombuffer(data, dtype=np.uint8)]
+    np.cumsum(sums, out=sums)
+    rolling = np.empty_like(sums)
+    rolling[:CDC_WINDOW] = sums[:CDC_WINDOW]
+    np.subtract(sums[CDC_WINDOW:], sums[:-CDC_WINDOW], out=rolling[CDC_WINDOW:])
+    np.bitwise_and(rolling, np.uint32((1 << CDC_AVG_BITS) - 1), out=rolling)
+    candidates = np.flatnonzero(rolling == 0) + 1
+
+    cuts, start = [], 0
+    while True:
+        i = np.searchsorted(candidates, start + CDC_MIN)
+        limit = start + CDC_MAX
+        if i < len(candidates) and candidates[i] <= min(limit, n):
+            start = int(candidates[i])
+        elif limit <= n:
+            start = limit
+        else:
+            break
+        cuts.append(start)
+    if final and start < n:
+        cuts.append(n)
+    return cuts
+
+def file_chunks(path):
+    """Yield the content-defined chunks of a file."""
+    carry = b""
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(CDC_READ)
+            data = carry + block
+            start = 0
+            for cut in cdc_cuts(data, final=not block):
+                yield data[start:cut]
+                start = cut
+            carry = data[start:]
+            if not block:
+                return
+
+def chunk_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+def pack_chunk(raw, codec):
+    """(codec, bytes) for storing a chunk; chunks that don't shrink are stored."""
+    method, level = CODECS[codec]
+    if method == zipfile.ZIP_STORED:
+        return "store", raw
+    c = get_compressor(method, level)
+    data = c.compress(raw) + c.flush()
+    if len(data) >= len(raw):
+        return "store", raw
+    return codec, data
+
+def unpack_chunk(data, codec):
+    method, _ = CODECS[codec]
+    if method == zipfile.ZIP_DEFLATED:
+        return zlib.decompress(data, -15)
+    if method == zipfile.ZIP_BZIP2:
+        return bz2.decompress(data)
+    if method == zipfile.ZIP_LZMA:
+        return zipfile.LZMADecompressor().decompress(data)
+    return data
+
+def load_backup_index(backup_dir):
+    path = Path(backup_dir) / BACKUP_INDEX
+    if not path.exists():
+        return {"version": BACKUP_VERSION, "runs": 0, "chunks": {}, "files": {}}
+    state = json.loads(path.read_text())
+    if state.get("version", 0) > BACKUP_VERSION:
+        raise ValueError(f"Unsupported backup index version {state['version']}.")
+    return state
+
+def save_backup_index(backup_dir, state):
+    save_json(Path(backup_dir) / BACKUP_INDEX, state)
+
+def is_backup_manifest(path):
+    if Path(path).suffix.lower() != ".json":
+        return False
+    with open(path) as f:
+        return json.load(f).get("kind") == "backup"
+
+def backup(backup_dir, inputs=None, settings=None, progress=None, timings=None):
+    """Back up `inputs` (or the input folder) into `backup_dir`, encoding only new chunks.
+
+    Writes backup-NNNN.json, the manifest for this run, and a delta video
+    with the chunks no earlier run stored (none if nothing changed).
+    Returns a report with the manifest and video paths and the file, chunk
+    and new-byte counts. Restore with extract(manifest).
+    """
+    if settings is None:
+        settings = load_settings()
+    width, height, fps, video_codec, fec_level = video_params(settings)
+    backup_dir = Path(backup_dir)
+    backup_dir.mkdir(parents=True, exist_ok=True)
+    state = load_backup_index(backup_dir)
+    name = f"backup-{state['runs'] + 1:04d}"
+    video_path = backup_dir / f"{name}{VIDEO_CODECS[video_codec]}"
+
+    entries = input_entries(inputs)
+    changed = set()
+    for f, arcname in entries:
+        st = f.stat()
+        known = state["files"].get(arcname)
+        if not (known and known[:2] == [st.st_size, st.st_mtime_ns]
+                and all(h in state["chunks"] for h in known[2])):
+            changed.add(arcname)
+    codec = resolve_codec(settings, [f for f, arcname in entries if arcname in changed])
+
+    tracker = Progress(progress, "encode", input_size([f for f, _ in entries]), Timings(timings))
+    files, chunks = {}, {}
+    pipe = sink = None
+    written = new_chunks = 0
+    try:
+        for f, arcname in entries:
+            st = f.stat()
+            if arcname not in changed:
+                hashes = state["files"][arcname][2]
+                tracker.add(nbytes=st.st_size)
+            else:
+                hashes = []
+                for raw in tracker.timings.iterate("chunk_input", file_chunks(f)):
+                    h = chunk_hash(raw)
+                    hashes.append(h)
+                    if h not in state["chunks"] and h not in chunks:
+                        if sink is None:
+                            # The delta video is only created once there is something new
+                            video = cv2.VideoWriter(str(video_path), cv2.VideoWriter_fourcc(*video_codec),
+                                                    fps, (width, height))
+                            if not video.isOpened():
+                                raise RuntimeError(f"This OpenCV build cannot write {video_codec} video.")
+                            pipe = ThreadedWriter(video, (height, width, 3), timings=tracker.timings)
+                            sink = FrameWriter(pipe, width, height, codec="store", fec_level=fec_level,
+                                               progress=tracker)
+                        with tracker.timings.time("chunk_compress", nbytes=len(raw)):
+                            chunk_codec, data = pack_chunk(raw, codec)
+                        chunks[h] = [video_path.name, written // sink.capacity, written, len(data), chunk_codec]
+                        sink.write(data)
+                        written += len(data)
+                        new_chunks += 1
+                    tracker.add(nbytes=len(raw))
+            files[arcname] = [st.st_size, st.st_mtime_ns, hashes]
+        if sink is not None:
+            sink.close()
+    except BaseException:
+        if pipe is not None:
+            try:
+                pipe.release()
+            finally:
+                video_path.unlink(missing_ok=True)
+        raise
+    if pipe is not None:
+        pipe.release()
+
+    state["chunks"].update(chunks)
+    used = {h for _, _, hashes in files.values() for h in hashes}
+    manifest = {
+        "version": BACKUP_VERSION,
+        "kind": "backup",
+        "run": state["runs"] + 1,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "files": [{"name": arcname, "size": size, "chunks": hashes}
+                  for arcname, (size, _, hashes) in files.items()],
+        "chunks": {h: state["chunks"][h] for h in used},
+    }
+    manifest_path = backup_dir / f"{name}.json"
+    manifest_path.write_text(json.dumps(manifest))
+    state.update(runs=state["runs"] + 1, files=files)
+    save_backup_index(backup_dir, state)
+    tracker.finish()
+    return {
+        "manifest": str(manifest_path),
+        "video": str(video_path) if sink is not None else None,
+        "files": len(files),
+        "chunks": len(used),
+        "new_chunks": new_chunks,
+        "new_bytes": written,
+    }
+
+def restore_backup(manifest_path, dest, progress=None, timings=None):
+    """Rebuild a backup's whole tree in `dest` from its manifest and the videos beside it."""
+    manifest = json.loads(Path(manifest_path).read_text())
+    if manifest.get("version", 0) > BACKUP_VERSION:
+        raise ValueError(f"Unsupported backup manifest version {manifest['version']}.")
+    folder = Path(manifest_path).parent
+    dest = Path(dest).resolve()
+    tracker = Progress(progress, "extract", sum(f["size"] for f in manifest["files"]), Timings(timings))
+    readers = {}
+    stats = {"corrected": 0}
+    try:
+        for entry in manifest["files"]:
+            target = (dest / entry["name"]).resolve()
+            if not target.is_relative_to(dest):
+                raise ValueError(f"Backup entry {entry['name']!r} points outside the destination.")
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with open(target, 'wb') as out:
+                for h in entry["chunks"]:
+                    video, _, offset, length, codec = manifest["chunks"][h]
+                    if video not in readers:
+                        readers[video] = PayloadReader(folder / video)
+                    reader = readers[video]
+                    with tracker.timings.time("chunk_read", nbytes=length):
+                        reader.seek(offset)
+                        data = reader.read(length)
+                    raw = unpack_chunk(data, codec)
+                    if chunk_hash(raw) != h:
+                        raise ValueError(f"Chunk {h[:12]} of {entry['name']} is corrupt.")
+                    out.write(raw)
+                    tracker.add(nbytes=len(raw))
+    finally:
+        for reader in readers.values():
+            stats["corrected"] += reader.stats["corrected"]
+            reader.close()
+    tracker.finish()
+    return stats
@@ -2,6 +2,7 @@ import customtkinter as ctk
 import tkinter as tk
 from tkinter import filedialog, messagebox
 import threading
+import queue
 import time
 import math
 import os
@@ -36,6 +37,10 @@ class BitStreamApp(ctk.CTk):
         
         self.is_running = False
         self.settings_window = None
+        # Backend progress events, filled by the worker thread and drained on the Tk loop
+        self.events = queue.Queue()
+        if HAS_BACKEND:
+            backend.ensure_dirs()
         
         # 1. Setup the Canvas (The Visuals)
         self.setup_canvas()
@@ -297,7 +302,7 @@ class BitStreamApp(ctk.CTk):
         
         self.settings_window = ctk.CTkToplevel(self)
         self.settings_window.title("Settings")
-        self.settings_window.geometry("360x400") # Optimized height
+        self.settings_window.geometry("360x570") # Optimized height
         self.settings_window.configure(fg_color=BG)
         self.settings_window.resizable(False, False)
         
@@ -330,6 +335,16 @@ class BitStreamApp(ctk.CTk):
                           fg_color=GRAY, button_color=BLUE, button_hover_color=CYAN,
                           text_color=WHITE, dropdown_fg_color=GRAY, dropdown_text_color=WHITE).pack(padx=40, pady=(2, 10), fill="x")
         
+        # Compression
+        ctk.CTkLabel(self.settings_window, text="Compression",
+                     text_color=WHITE, font=("Inter", 14)).pack(anchor="w", padx=40, pady=(5, 0))
+        
+        self.v_comp = tk.StringVar(value=curr.get("compression", "deflate-6"))
+        ctk.CTkOptionMenu(self.settings_window, variable=self.v_comp,
+                          values=["auto", "store", "deflate-1", "deflate-6", "deflate-9", "bz2", "lzma"],
+                          fg_color=GRAY, button_color=BLUE, button_hover_color=CYAN,
+                          text_color=WHITE, dropdown_fg_color=GRAY, dropdown_text_color=WHITE).pack(padx=40, pady=(2, 10), fill="x")
+        
         # Separator
         ctk.CTkFrame(self.settings_window, height=1, fg_color=GRAY).pack(fill="x", padx=30, pady=10)
         
@@ -342,6 +357,25 @@ class BitStreamApp(ctk.CTk):
         ctk.CTkSwitch(steg_frame, text="", variable=self.v_steg,
                       progress_color=BLUE, button_color=CYAN, button_hover_color=WHITE, fg_color=GRAY, width=40).pack(side="right")
         
+        # Bits hidden per channel byte (more bits = more capacity, more noise)
+        bits_frame = ctk.CTkFrame(self.settings_window, fg_color=BG)
+        bits_frame.pack(fill="x", padx=40, pady=5)
+        ctk.CTkLabel(bits_frame, text="Bits per Channel", text_color=WHITE, font=("Inter", 14)).pack(side="left")
+        
+        self.v_bits = tk.StringVar(value=str(curr.get("steg_bits", 1)))
+        ctk.CTkOptionMenu(bits_frame, variable=self.v_bits, values=["1", "2", "3", "4"], width=70,
+                          fg_color=GRAY, button_color=BLUE, button_hover_color=CYAN,
+                          text_color=WHITE, dropdown_fg_color=GRAY, dropdown_text_color=WHITE).pack(side="right")
+        
+        # Trim cover after the payload (skips re-encoding untouched frames)
+        trim_frame = ctk.CTkFrame(self.settings_window, fg_color=BG)
+        trim_frame.pack(fill="x", padx=40, pady=5)
+        ctk.CTkLabel(trim_frame, text="Trim Cover After Payload", text_color=WHITE, font=("Inter", 14)).pack(side="left")
+        
+        self.v_trim = tk.BooleanVar(value=curr.get("steg_trim", False))
+        ctk.CTkSwitch(trim_frame, text="", variable=self.v_trim,
+                      progress_color=BLUE, button_color=CYAN, button_hover_color=WHITE, fg_color=GRAY, width=40).pack(side="right")
+        
         # Auto-Sort (Tight spacing)
         sort_frame = ctk.CTkFrame(self.settings_window, fg_color=BG)
         sort_frame.pack(fill="x", padx=40, pady=5)
@@ -361,12 +395,18 @@ class BitStreamApp(ctk.CTk):
 
     def save_settings(self):
         if HAS_BACKEND:
-            backend.save_settings({
+            # Merge into the stored settings so keys without a widget survive
+            settings = dict(backend.load_settings())
+            settings.update({
                 "resolution": self.v_res.get(),
                 "fps": int(self.v_fps.get()),
+                "compression": self.v_comp.get(),
                 "steganography": self.v_steg.get(),
+                "steg_trim": self.v_trim.get(),
+                "steg_bits": int(self.v_bits.get()),
                 "auto_sort": self.v_sort.get()
             })
+            backend.save_settings(settings)
         self.update_cover_btn_visibility()
         self.close_settings()
         self.canvas.itemconfig(self.eta_id, text="Settings Saved")
@@ -386,20 +426,49 @@ class BitStreamApp(ctk.CTk):
                            new_x1, self.PB_INNER_Y1)
         self.canvas.itemconfig(self.pct_id, text=f"{int(val * 100)}%")
 
+    def poll_events(self):
+        """Drain the event queue on the Tk main loop, rendering only the newest event."""
+        latest = None
+        while True:
+            try:
+                latest = self.events.get_nowait()
+            except queue.Empty:
+                break
+        if latest is not None:
+            self.show_event(latest)
+        if self.is_running or not self.events.empty():
+            self.after(100, self.poll_events)
+
+    def show_event(self, ev):
+        if "status" in ev:
+            # Final message from the worker thread
+            if ev.get("fraction") is not None:
+                self.set_progress(ev["fraction"])
+            self.canvas.itemconfig(self.eta_id, text=ev["status"])
+            return
+        if ev["fraction"] is not None:
+            self.set_progress(ev["fraction"])
+        text = f"{ev['mbps']:.1f} MB/s  {ev['frames']} frames"
+        if ev["eta"] is not None:
+            m, s = divmod(int(ev["eta"]), 60)
+            text += f"  eta {m}m {s:02d}s"
+        self.canvas.itemconfig(self.eta_id, text=text)
+
     # ─── THREADED RUNNERS (REAL FUNCTIONALITY) ───────────────────────────────
     def run_encode(self):
         if self.is_running: return
-        self.start_thread(backend.encode if HAS_BACKEND else lambda: time.sleep(2), "encoding...")
+        func = (lambda progress: backend.encode(progress=progress)) if HAS_BACKEND else (lambda progress: time.sleep(2))
+        self.start_thread(func, "encoding...")
 
     def run_decode(self):
         if self.is_running: return
         vid = filedialog.askopenfilename(
             title="Select encoded video to extract",
-            filetypes=[("Video Files", "*.avi *.mp4 *.mkv")]
+            filetypes=[("Video Files", "*.avi *.mp4 *.mkv"), ("Shard Manifest", "*.json")]
         )
         if not vid: return
         
-        func = (lambda: backend.extract(Path(vid))) if HAS_BACKEND else (lambda: time.sleep(2))
+        func = (lambda progress: backend.extract(Path(vid), progress=progress)) if HAS_BACKEND else (lambda progress: time.sleep(2))
         self.start_thread(func, "extracting...")
 
     def start_thread(self, func, status_msg):
@@ -408,25 +477,20 @@ class BitStreamApp(ctk.CTk):
         self.set_progress(0)
         
         def work():
+            # Runs off the Tk thread: only ever talks to the UI through self.events
             start = time.time()
-            # Fake progress purely for visual feedback (since backend blocks)
-            for i in range(1, 95):
-                if not self.is_running: break
-                time.sleep(0.02)
-                self.set_progress(i / 100)
-            
             try:
-                func()
+                func(self.events.put)
                 elapsed = int(time.time() - start)
-                self.after(0, lambda: self.set_progress(1.0))
-                self.after(0, lambda: self.canvas.itemconfig(self.eta_id, text=f"done in {elapsed}s"))
+                self.events.put({"status": f"done in {elapsed}s", "fraction": 1.0})
             except Exception as e:
                 print(f"[Error] {e}")
-                self.after(0, lambda: self.canvas.itemconfig(self.eta_id, text="error"))
+                self.events.put({"status": "error"})
             finally:
                 self.is_running = False
         
         threading.Thread(target=work, daemon=True).start()
+        self.poll_events()
 
 # ─── LAUNCH ──────────────────────────────────────────────────────────────────
 if __name__ == "__main__":
@@ -0,0 +1,21 @@
+import cli
+
+def test_batch_runs_dependent_jobs_in_order(tmp_path):
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "docs" / "a.txt").write_text("hello")
+    video, out = str(tmp_path / "docs.avi"), str(tmp_path / "restored")
+    jobs = [
+        {"command": "extract", "video": video, "output": out, "depends_on": [1]},
+        {"command": "encode", "inputs": [str(tmp_path / "docs")], "output": video},
+        {"command": "verify", "video": str(tmp_path / "missing.avi")},
+        {"command": "inspect", "video": video, "depends_on": [2]},
+        {"command": "verify", "video": video, "depends_on": [5]},
+        {"command": "verify", "video": video, "depends_on": [4]},
+    ]
+    results = {r["job"]: r for r in cli.run_batch(jobs, workers=2)}
+    assert sorted(results) == list(range(6))
+    assert results[1]["ok"] and results[0]["ok"]
+    assert (tmp_path / "restored" / "docs" / "a.txt").read_text() == "hello"
+    assert not results[2]["ok"]
+    assert results[3] == {"job": 3, "ok": False, "error": "Skipped: job 2 failed."}
+    assert not results[4]["ok"] and not results[5]["ok"]
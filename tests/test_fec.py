@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+import fec
+
+WIDTH, HEIGHT = 256, 256
+
+def random_payload(level, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, fec.frame_capacity(WIDTH, HEIGHT, level), dtype=np.uint8)
+
+def test_rs_roundtrip():
+    msgs = np.random.default_rng(1).integers(0, 256, (4, 223), dtype=np.uint8)
+    codewords = fec.rs_encode(msgs, 32)
+    assert codewords.shape == (4, 255)
+    assert fec.rs_decode(codewords, 32) == 0
+    assert (codewords[:, :223] == msgs).all()
+
+def test_rs_corrects_up_to_half_the_parity():
+    msgs = np.random.default_rng(2).integers(0, 256, (3, 223), dtype=np.uint8)
+    codewords = fec.rs_encode(msgs, 32)
+    rng = np.random.default_rng(3)
+    for row in range(3):
+        for pos in rng.choice(255, 16, replace=False):
+            codewords[row, pos] ^= rng.integers(1, 256)
+    assert fec.rs_decode(codewords, 32) == 48
+    assert (codewords[:, :223] == msgs).all()
+
+def test_rs_rejects_too_many_errors():
+    codewords = fec.rs_encode(np.zeros((1, 223), dtype=np.uint8), 32)
+    codewords[0, :40] ^= 0x5A
+    with pytest.raises(ValueError):
+        fec.rs_decode(codewords, 32)
+
+@pytest.mark.parametrize("level", sorted(fec.LEVELS))
+def test_frame_roundtrip(level):
+    data = random_payload(level, level)
+    frame = fec.encode_frame(data, WIDTH, HEIGHT, level)
+    assert frame.shape == (HEIGHT, WIDTH, 3)
+    decoded, corrected = fec.decode_frame(frame, level)
+    assert corrected == 0
+    assert (decoded == data).all()
+
+@pytest.mark.parametrize("level", sorted(fec.LEVELS))
+def test_frame_survives_noise_and_flipped_blocks(level):
+    data = random_payload(level, 10 + level)
+    frame = fec.encode_frame(data, WIDTH, HEIGHT, level).astype(np.int16)
+    rng = np.random.default_rng(20 + level)
+    block, bits, nsym, rows, cols, ncw, n = fec.layout(WIDTH, HEIGHT, level)
+    # Codec-like noise that stays within half a gray step on average (64
+    # levels are only 4 apart, and clipping at black and white biases it)
+    noise = 60 if bits == 1 else 5
+    frame += rng.integers(-noise, noise + 1, frame.shape, dtype=np.int16)
+    frame = np.clip(frame, 0, 255).astype(np.uint8)
+    # Plus whole blocks read the wrong way: 0.5% of them
+    for cell in rng.choice(rows * cols, max(1, rows * cols // 200), replace=False):
+        r, c = divmod(int(cell), cols)
+        area = frame[r * block:(r + 1) * block, c * block:(c + 1) * block]
+        area[:] = 255 - area.mean().astype(np.uint8)
+    decoded, corrected = fec.decode_frame(frame, level)
+    assert corrected > 0
+    assert (decoded == data).all()
@@ -0,0 +1,6 @@
+import bench
+
+def test_backend_imports_within_budget():
+    # Also fails if index or cli starts importing cv2, numpy, tkinter or
+    # multiprocessing at module level again
+    assert bench.check_import_time()
@@ -0,0 +1,169 @@
+import io
+import json
+import os
+import random
+import zipfile
+
+import cv2
+import numpy as np
+import pytest
+
+import fec
+import index
+
+SETTINGS = dict(index.DEFAULT_SETTINGS, resolution="256x256")
+
+class Interrupted(Exception):
+    pass
+
+def make_tree(root, seed=0):
+    """A small folder of random and compressible files, with a subfolder."""
+    rng = random.Random(seed)
+    (root / "sub").mkdir(parents=True)
+    for i in range(3):
+        (root / f"r{i}.bin").write_bytes(rng.randbytes(rng.randint(20_000, 120_000)))
+        (root / "sub" / f"t{i}.txt").write_text(f"line {i} of text\n" * rng.randint(500, 5000))
+    (root / "empty.txt").write_bytes(b"")
+    return root
+
+def read_tree(root):
+    return {str(p.relative_to(root)).replace(os.sep, "/"): p.read_bytes()
+            for p in sorted(root.rglob("*")) if p.is_file() and not p.name.startswith(".")}
+
+def interrupt_after(frames):
+    """Progress callback that stops a run once `frames` frames are done."""
+    def callback(event):
+        if event["frames"] >= frames and not event["done"]:
+            raise Interrupted
+    return callback
+
+@pytest.fixture(scope="module")
+def cover(tmp_path_factory):
+    path = tmp_path_factory.mktemp("cover") / "cover.avi"
+    video = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"FFV1"), 24, (256, 256))
+    rng = np.random.default_rng(0)
+    for _ in range(40):
+        video.write(rng.integers(0, 256, (256, 256, 3), dtype=np.uint8))
+    video.release()
+    return path
+
+def extract_all(video, dest, settings=None):
+    index.extract(video, dict({"auto_sort": False}, **(settings or {})), dest=dest)
+    return read_tree(dest)
+
+def encode_payload(payload, path, width=256, height=256):
+    """Encode raw payload bytes (a hand-made archive) straight into frames."""
+    video = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"FFV1"), 24, (width, height))
+    sink = index.FrameWriter(video, width, height, codec="store")
+    sink.write(payload)
+    sink.close()
+    video.release()
+    return path
+
+def test_append_replacing_a_file_extracts_the_new_content(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    (tmp_path / "a" / "doc.bin").write_bytes(os.urandom(3_000_000))
+    (tmp_path / "b" / "doc.bin").write_bytes(b"seventeen bytes!!")
+    video = index.encode(SETTINGS, inputs=[tmp_path / "a" / "doc.bin"], out_path=tmp_path / "x.avi")
+    manifest = index.append(video, [tmp_path / "b" / "doc.bin"], SETTINGS)
+    # The old member's writes were once still pending when the new one truncated the file
+    for i in range(5):
+        assert extract_all(manifest, tmp_path / f"out{i}") == {"doc.bin": b"seventeen bytes!!"}
+
+def test_empty_archive(tmp_path):
+    (tmp_path / "empty").mkdir()
+    video = index.encode(SETTINGS, inputs=[tmp_path / "empty"], out_path=tmp_path / "e.avi")
+    assert extract_all(video, tmp_path / "out") == {}
+
+def test_corrupt_member_is_removed(tmp_path):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as z:
+        z.writestr("good.txt", "fine")
+        z.writestr("bad.txt", "original content")
+    payload = buf.getvalue().replace(b"original content", b"tampered content")
+    video = encode_payload(payload, tmp_path / "c.avi")
+    with pytest.raises(ValueError, match="bad.txt is corrupt"):
+        index.extract(str(video), {"auto_sort": False}, dest=tmp_path / "out")
+    assert (tmp_path / "out" / "good.txt").read_bytes() == b"fine"
+    assert not (tmp_path / "out" / "bad.txt").exists()
+
+def test_normal_roundtrip(tmp_path):
+    tree = make_tree(tmp_path / "in")
+    video = index.encode(SETTINGS, inputs=[tree], out_path=tmp_path / "v.avi")
+    assert extract_all(video, tmp_path / "out") == {f"in/{k}": v for k, v in read_tree(tree).items()}
+    assert index.verify(video)["ok"]
+
+@pytest.mark.parametrize("trim", [False, True])
+@pytest.mark.parametrize("bits", [1, 2, 3, 4])
+def test_stego_roundtrip(tmp_path, cover, bits, trim):
+    tree = make_tree(tmp_path / "in", seed=bits)
+    settings = dict(SETTINGS, steganography=True, steg_bits=bits, steg_trim=trim)
+    video = index.encode(settings, inputs=[tree], out_path=tmp_path / "s.avi", cover=cover)
+    frames = int(cv2.VideoCapture(video).get(cv2.CAP_PROP_FRAME_COUNT))
+    assert (frames < 40) if trim else (frames == 40)
+    assert extract_all(video, tmp_path / "out") == {f"in/{k}": v for k, v in read_tree(tree).items()}
+    assert index.verify(video)["ok"]
+
+def test_interrupted_extract_resumes(tmp_path, monkeypatch):
+    monkeypatch.setattr(index, "JOURNAL_INTERVAL", 0)
+    monkeypatch.setattr(index, "PROGRESS_INTERVAL", 0)
+    tree = make_tree(tmp_path / "in")
+    for i in range(6):
+        (tree / f"big{i}.bin").write_bytes(os.urandom(300_000))
+    settings = dict(SETTINGS, compression="store")
+    video = index.encode(settings, inputs=[tree], out_path=tmp_path / "v.avi")
+    dest = tmp_path / "out"
+    with pytest.raises(Interrupted):
+        index.extract(video, {"auto_sort": False}, interrupt_after(8), dest=dest)
+    assert json.loads((dest / index.EXTRACT_JOURNAL).read_text())["offset"] > 0
+    resumed, full = [], []
+    index.extract(video, {"auto_sort": False}, resumed.append, dest=dest)
+    assert read_tree(dest) == {f"in/{k}": v for k, v in read_tree(tree).items()}
+    assert not (dest / index.EXTRACT_JOURNAL).exists()
+    # The rerun picked up from the journal instead of decoding everything
+    index.extract(video, {"auto_sort": False}, full.append, dest=tmp_path / "full")
+    assert resumed[-1]["frames"] < full[-1]["frames"]
+
+def test_checkpointed_encode_resumes(tmp_path, monkeypatch):
+    monkeypatch.setattr(index, "PROGRESS_INTERVAL", 0)
+    tree = make_tree(tmp_path / "in")
+    for i in range(6):
+        (tree / f"big{i}.bin").write_bytes(os.urandom(300_000))
+    settings = dict(SETTINGS, compression="store", checkpoint_frames=3)
+    out = tmp_path / "v.avi"
+    with pytest.raises(Interrupted):
+        index.encode(settings, interrupt_after(8), inputs=[tree], out_path=out)
+    committed = json.loads(out.with_name("v.avi.journal").read_text())["segments"]
+    assert committed
+    stamps = {s["file"]: (tmp_path / s["file"]).stat().st_mtime_ns for s in committed}
+    manifest = index.encode(settings, inputs=[tree], out_path=out)
+    segments = json.loads(open(manifest).read())["segments"]
+    assert segments[:len(committed)] == committed
+    # Committed segments were kept, not encoded again
+    assert {name: (tmp_path / name).stat().st_mtime_ns for name in stamps} == stamps
+    assert extract_all(manifest, tmp_path / "out") == {f"in/{k}": v for k, v in read_tree(tree).items()}
+
+def test_backup_roundtrip(tmp_path):
+    tree = make_tree(tmp_path / "src")
+    first = index.backup(tmp_path / "backups", inputs=[tree], settings=SETTINGS)
+    before = read_tree(tree)
+    (tree / "r0.bin").write_bytes((tree / "r0.bin").read_bytes()[:5000] + b"edited")
+    (tree / "sub" / "new.txt").write_text("added later")
+    second = index.backup(tmp_path / "backups", inputs=[tree], settings=SETTINGS)
+    assert second["new_bytes"] < first["new_bytes"]
+    index.restore_backup(first["manifest"], tmp_path / "one")
+    index.extract(second["manifest"], {"auto_sort": False}, dest=tmp_path / "two")
+    assert read_tree(tmp_path / "one") == {f"src/{k}": v for k, v in before.items()}
+    assert read_tree(tmp_path / "two") == {f"src/{k}": v for k, v in read_tree(tree).items()}
+
+def test_probing_fec_levels_counts_no_corrections():
+    # A frame that decodes (with repairs) at FEC level 1 but holds no header
+    # must not report the repairs of the probe
+    data = np.random.default_rng(5).integers(0, 256, fec.frame_capacity(256, 256, 1), dtype=np.uint8)
+    frame = fec.encode_frame(data, 256, 256, 1)
+    frame[0, :40] ^= 255
+    stats = {"corrected": 0}
+    header, _, level = index.detect_frame(frame, stats)
+    assert header is None and level == 0
+    assert stats == {"corrected": 0}